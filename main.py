@@ -6,17 +6,135 @@
 
 from multiprocess import Process, Queue
 from models.construal    import get_recipeMatrix
-from models.construal    import get_featureMatrix
-from models.construal    import guess, recall, plan, review, revise, reason
+from models.construal    import get_featureMatrix, get_compactMatrix, get_locationMatrix
+from models.construal    import guess, recall, plan, plan_anytime, plan_incremental, score_travel, get_placement, estimate_plans, review, revise, revise_prior, plan_batch, get_routePlan, check_found, reason_model, get_planFrame, get_memoStats
 from models.conceptnet   import get_uri
-from models.malmo        import run
+from models.malmo        import run, get_travelTable, get_travel
+from models.store        import disk_call, get_fileHash, share_arrays, attach_arrays, prior_get, prior_put
 import time, datetime
+import tempfile, shutil
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as  np
 import random
 
 # =============================================================================
 
+#stage columns of trial output (timings and sizes summed over replans, per level)
+cStage = ['reason (s)'] + ['{} L{} (s)'.format(x, k) for x in ['recall', 'plan', 'review'] for k in [1,2,3]]
+cStage = cStage + ['{} L{}'.format(x, k) for x in ['plans', 'product', 'review input', 'guard'] for k in [1,2,3]]
+
+#function (return planner state of a trial, i.e. shared arrays, locations, starting belief and planning caches)
+def get_planner(iInput):
+    iAbs        = iInput[2]
+    iSet        = iInput[3]
+    iPPR        = iInput[4]
+    iShare      = attach_arrays(iInput[6])     #read-only model arrays, memory-mapped (one copy for all trials)
+    iOpt        = iInput[7]
+    id_item     = iShare['id_item']
+    
+    pSrc    = 'utils/conceptnet.xlsx'
+    pLoc    = pd.read_excel(pSrc, keep_default_na=False)['set'+str(iSet)+'_pLoc'].values
+    pLoc    = [x for x in pLoc if len(x)>0]    
+    pLoc.append('self') 
+    yBelief = guess(id_item, iShare['id_uri'], pLoc, pSrc, iSet) #belief with minor abstraction
+    yBelief = get_locationMatrix(yBelief, pLoc)        #belief as items x locations
+    if iOpt['prior'] is not None: yBelief = revise_prior(yBelief, prior_get(iOpt['prior'], iSet), id_item, pLoc, iOpt['prior'])  #warm start from earlier trials on this set
+    
+    ans = {'id_item': id_item, 'mRecipe': iShare['mRecipe'], 'mFeature': iShare['mFeature'], 'mTravel': iShare['mTravel'], 'iOpt': iOpt,
+           'iAbs': iAbs, 'iSet': iSet, 'iPPR': iPPR, 'iInc': iInput[5], 'pSrc': pSrc, 'pLoc': pLoc, 'yBelief': yBelief}
+    ans['pModList'] = [0,1,2] if iAbs == 0 else [0, 0.8, 1.0]
+    ans['pTop'] = iPPR if iOpt['top'] else None         #plans enumerated per level
+    ans['mCentroid'] = {}                               #centroids per (location, level), updated each replan
+    ans['mReplan'] = {}                                 #plans of the last replan per (task, level), reused when locations are unchanged
+    ans['pool'] = ThreadPoolExecutor(iOpt['workers']) if iOpt['workers'] > 1 else None   #threads for levels (numpy stages release the GIL)
+    return ans
+
+#function (return reviewed plans per task for one replan, i.e. reason -> recall -> plan -> score per level -> review, adding stage times and sizes to iStage)
+def make_plans(iPlanner, tList, yBelief, xObserve, xNoFind, xPossess, iPos, iRan, iStage, pCache = None):
+    id_item     = iPlanner['id_item']
+    mRecipe     = iPlanner['mRecipe']
+    mFeature    = iPlanner['mFeature']
+    iOpt        = iPlanner['iOpt']
+    iAbs        = iPlanner['iAbs']
+    iSet        = iPlanner['iSet']
+    pLoc        = iPlanner['pLoc']
+    pTop        = iPlanner['pTop']
+    pModList    = iPlanner['pModList']
+    mCentroid   = iPlanner['mCentroid']
+    mReplan     = iPlanner['mReplan']
+    
+    mNoFind = get_locationMatrix(xNoFind, pLoc)        #false locations as items x locations
+    iTravel = get_travel(iPos, pLoc, iPlanner['mTravel']) if iOpt['travel'] is not None else None
+    mPlace  = get_placement(yBelief, mNoFind, xObserve, pLoc, iRan) if iOpt['estimate'] is not None else None   #item placement chances, as items x locations
+    print("\nPLANNING reason (all levels)")
+    t0 = time.perf_counter()
+    yLevels, temp = disk_call(pCache, 'reason', [yBelief, mFeature, list(pLoc), iAbs, list(pModList), iSet, iOpt['ann']],
+                              reason_model, yBelief, mFeature, pLoc, iAbs, iPlanner['pSrc'], pModList, iSet, mCentroid, iOpt['ann'])   #reason locations with abstraction (all levels)
+    mCentroid.update(temp)                              #centroid model as left by reasoning (also when read from the cache)
+    iStage['reason (s)'] += time.perf_counter() - t0
+    
+    #subfunction of make_plans (return plans per task of one level, i.e. recall -> plan, with stage times)
+    def get_level(ix):
+        pMod = pModList[ix-1]
+        print("\nPLANNING level {} of 3".format(ix))           
+        print('\trecall L{}'.format(ix))  
+        t0 = time.perf_counter()
+        yReason = recall(yLevels[ix-1], mNoFind)                                    #update locations with feedback
+        t1 = time.perf_counter()
+        print('\tplan L{}'.format(ix))       
+        if iOpt['deadline'] is not None:
+            yTemp = [plan_anytime(yReason, xPossess, mRecipe, id_item, pLoc, x, pMod, pTop, iOpt['deadline']) for x in tList]  #best plans found in time
+            print('\toptimal', [y['optimal'] for y in yTemp])
+        elif iOpt['incremental']:
+            yTemp = [plan_incremental(yReason, xPossess, mRecipe, id_item, pLoc, x, pMod, mReplan.setdefault((x, pMod), {}), pTop, 4, iOpt['guard']) for x in tList]  #make plans and score (changed items only)
+        elif len(tList) == 1:
+            yTemp = [disk_call(pCache, 'plan', [yReason, np.asarray(xPossess), mRecipe, list(id_item), list(pLoc), tList[0], pMod, pTop, iOpt['guard']],
+                               plan, yReason, xPossess, mRecipe, id_item, pLoc, tList[0], pMod, pTop, 4, iOpt['guard'])]  #make plans and score
+        else:
+            yTemp = disk_call(pCache, 'plan_batch', [yReason, np.asarray(xPossess), mRecipe, list(id_item), list(pLoc), list(tList), pMod, pTop, iOpt['guard']],
+                              plan_batch, yReason, xPossess, mRecipe, id_item, pLoc, list(tList), pMod, pTop, 4, iOpt['guard'])  #make plans and score, tasks sharing work
+        if iTravel is not None: yTemp = [score_travel(y, pLoc, iTravel, iOpt['travel']) for y in yTemp]            #add walking distance from position to score
+        if mPlace is not None: yTemp = [estimate_plans(y, mPlace, iTravel, iOpt['estimate']) for y in yTemp]      #success and search per plan, review orders by their ratio
+        t2 = time.perf_counter()
+        return yTemp, t1 - t0, t2 - t1
+    
+    iLevel = list(range(1, len(pModList)+1))
+    if iPlanner['pool'] is None: yLevel = [get_level(ix) for ix in iLevel]
+    else: yLevel = list(iPlanner['pool'].map(get_level, iLevel))                 #levels run concurrently, merged below in level order
+    ans = {x: None for x in tList}
+    for ix in iLevel:
+        yTemp, tRecall, tPlan = yLevel[ix-1]
+        print('\treview L{}'.format(ix)) 
+        t0 = time.perf_counter()
+        nTop = iPlanner['iPPR'] if ix == len(pModList) else None                    #only the last review is cut to plans per replan
+        for x, y in zip(tList, yTemp):
+            iStage['plans L{}'.format(ix)] += y['nPlan']
+            iStage['product L{}'.format(ix)] += y.get('nProduct', y['nPlan'])
+            iStage['review input L{}'.format(ix)] += y['nPlan'] + (0 if ans[x] is None else ans[x]['nPlan'])
+            iStage['guard L{}'.format(ix)] += int(y.get('guard', False))             #product was over budget, plans are partial
+            ans[x] = review(y, ans[x], pLoc, iPlanner['iInc'], nTop)                    #add plans and sort 
+        iStage['recall L{} (s)'.format(ix)] += tRecall
+        iStage['plan L{} (s)'.format(ix)] += tPlan
+        iStage['review L{} (s)'.format(ix)] += time.perf_counter() - t0
+    return ans
+
+#function (return labeled plans of a task for run, cut to iPPR plans, and the score of the first; one random location for the task item and score None if it has no plan)
+def get_taskFrame(yPlan, iTask, id_item, pLoc, iPPR):
+    if yPlan is not None: 
+        ans = get_planFrame(yPlan, id_item, pLoc)                       #label plans for run
+        score = ans.P0.score
+        ans = ans.iloc[:(len(pLoc)-1), :min(iPPR, len(ans.columns))]
+    else: 
+        ans = pd.DataFrame(index = pLoc, columns = ['P0'])
+        ix = np.random.randint(0, len(pLoc)-1)
+        temp = [[] for x in range(len(pLoc))]
+        temp[ix] = [iTask]
+        ans.P0 = temp
+        ans = ans.iloc[:(len(pLoc)-1)]
+        score = None
+    return ans, score
+
 def trial(q, iInput):             
     nRun_max = 20
        
@@ -27,10 +145,10 @@ def trial(q, iInput):
     iSet        = iInput[3]
     iPPR        = iInput[4]
     iInc        = iInput[5]
-    id_item     = iInput[6]
-    id_uri      = iInput[7]
-    mRecipe     = iInput[8]    
-    mFeature    = iInput[9] 
+    iOpt        = iInput[7]
+    iPlanner    = get_planner(iInput)
+    id_item     = iPlanner['id_item']
+    pLoc        = iPlanner['pLoc']
     
     #initialize observation vars
     xObserve = [[] for x in range(len(id_item))]        #true locations of items (observed during trial)
@@ -57,72 +175,41 @@ def trial(q, iInput):
     startTime   = ''
     endTime     = ''
     lastPlan    = ''
+    iStage      = {x: 0 for x in cStage}
     
     #initialize environment input
     iEnv = [xObserve, xNoFind, xPossess, iSet, iRan, iInc, iStats, iResult, iPos, iTrial]
     
     #initialize planning 
-    pSrc    = 'utils/conceptnet.xlsx'
-    pLoc    = pd.read_excel(pSrc, keep_default_na=False)['set'+str(iSet)+'_pLoc'].values
-    pLoc    = [x for x in pLoc if len(x)>0]    
-    pLoc.append('self') 
-    yBelief = guess(id_item, id_uri, pLoc, pSrc, iSet) #belief with minor abstraction
-    yReason = [[] for x in range(len(id_item))]        #belief with abstraction   
+    yBelief = iPlanner['yBelief']                      #belief with minor abstraction, as items x locations
     
     #initialize output
     iOut = [iTrial, iTask, iAbs, iSet, iPPR, iInc, startTime, endTime, planTime/60, runTime/60, totTime/60, mcTime, mcDist, nObs, nPlanner, nNoPlan, nRun, iResult, lastPlan]
+    iOut = iOut + [iStage[x] for x in cStage]
     
     while iContinue:
-        
-        yPlan    = None                                     #plans formed by agent
 
         #start plan timer
-        plan_t0     = np.round(time.time(), 2)
+        plan_t0     = time.perf_counter()
         startTime   = datetime.datetime.now()
         startTime   = startTime.strftime("%Y-%m-%d %H:%M:%S")
         
         #make plans
         nPlanner += 1
-        if iAbs == 0:   pModList = [0,1,2]      
-        else:           pModList = [0, 0.8, 1.0]   
-        for pMod in pModList:
-            ix  = pModList.index(pMod) + 1    
-            print("\nPLANNING level {} of 3".format(ix))           
-            print('\treason')
-            yReason = reason(yBelief, mFeature, pLoc, iAbs, pSrc, pMod, iSet)       #reason locations with abstraction
-            print('\trecall')  
-            yReason = recall(yReason, xNoFind)                                      #update locations with feedback
-            print('\tplan')       
-            yTemp   = plan(yReason, xPossess, mRecipe, id_item, pLoc, iTask, pMod)  #make plans and score
-            print('\treview') 
-            yPlan   = review(yTemp, yPlan, pLoc, iInc)                              #add plans and sort 
+        pCache = iOpt['cache'] if nPlanner == 1 else None          #first round is the same for every seed and plans per replan
+        yPlan = make_plans(iPlanner, [iTask], yBelief, xObserve, xNoFind, xPossess, iPos, iRan, iStage, pCache)[iTask]
 
         #check plans
-        if yPlan is not None: 
-            temp = yPlan.P0                                                  
-            temp = temp.score                                             
-            if temp == 1: iContinue = False
-            del temp
-            count = len(yPlan.columns)
-            if count > iPPR: yPlan = yPlan.iloc[:(len(pLoc)-1),:iPPR]
-            else: yPlan = yPlan.iloc[:(len(pLoc)-1),:count] 
-            
-        else: 
-            yPlan= pd.DataFrame(index = pLoc, columns = ['P0'])
-            ix = np.random.randint(0, len(pLoc)-1)
-            temp = [[] for x in range(len(pLoc))]
-            temp[ix] = [iTask]
-            yPlan.P0 = temp
-            yPlan = yPlan.iloc[:(len(pLoc)-1)]
-            nNoPlan += 1
+        yPlan, temp = get_taskFrame(yPlan, iTask, id_item, pLoc, iPPR)
+        if temp is None: nNoPlan += 1
+        elif temp == 1: iContinue = False
             
         #end plan timer
-        plan_t1 = np.round(time.time(), 2)
+        plan_t1 = time.perf_counter()
         planTime += (plan_t1 - plan_t0)
-        planTime = np.round(planTime, 2)
         
         #start run timer
-        run_t0 = np.round(time.time(), 2)
+        run_t0 = time.perf_counter()
            
         #run plans
         for col in yPlan:
@@ -137,9 +224,8 @@ def trial(q, iInput):
                 break
             
         #end run timer
-        run_t1 = np.round(time.time(), 2)
+        run_t1 = time.perf_counter()
         runTime += (run_t1 - run_t0)
-        runTime = np.round(runTime, 2)
 
         #update pack
         xObserve    = iEnv[0]
@@ -171,13 +257,128 @@ def trial(q, iInput):
                 temp = len(xObserve[ix])
                 nObs += temp      
                 
-            totTime = np.round(planTime + runTime, 2)
+            totTime = planTime + runTime
             
             iOut = [iTrial, iTask, iAbs, iSet, iPPR, iInc, startTime, endTime, planTime/60, runTime/60, totTime/60, mcTime, mcDist, nObs, nPlanner, nNoPlan, nRun, iResult, lastPlan]
+            iOut = iOut + [iStage[x] for x in cStage]
+            if iPlanner['pool'] is not None: iPlanner['pool'].shutdown()
+            if iOpt['prior'] is not None: prior_put(iOpt['prior'], iSet, list(id_item), xObserve, xNoFind)   #share what this trial learned
             print('completed trial {}'.format(iTrial))
+            print(get_memoStats())
             q.put(iOut)
             time.sleep(0.1)
 
+#function (run several tasks per trial, one mission per replan column along a route merging each open task's plan; one output row per task)
+def trial_multi(q, iInput):             
+    nRun_max = 20
+       
+    #unpack inputs (iTask is a list of tasks)
+    iTrial      = iInput[0]
+    iTask       = iInput[1]
+    iAbs        = iInput[2]
+    iSet        = iInput[3]
+    iPPR        = iInput[4]
+    iInc        = iInput[5]
+    iOpt        = iInput[7]
+    iPlanner    = get_planner(iInput)
+    id_item     = iPlanner['id_item']
+    pLoc        = iPlanner['pLoc']
+    
+    #initialize observation vars
+    xObserve = [[] for x in range(len(id_item))]        #true locations of items (observed during trial)
+    xNoFind  = [[] for x in range(len(id_item))]        #false locations of items (observed during trial)
+    xPossess = [0 for x in range(len(id_item))]
+    
+    #initizalize environment vars
+    iContinue = True 
+    iStats = (0,0)
+    iResult = 0
+    iPos = (0,0,90)
+    iRan = 0
+    
+    #initialize trial output (shared by tasks, except result and last plan)
+    planTime    = 0.0
+    runTime     = 0.0
+    mcDist      = 0
+    mcTime      = 0
+    nRun        = 0
+    nObs        = 0
+    nPlanner    = 0
+    nNoPlan     =  0
+    startTime   = ''
+    iStage      = {x: 0 for x in cStage}
+    tResult     = {x: 0 for x in iTask}                 #result per task (-1,0,1 for fail, IP, success)
+    tPlan       = {x: '' for x in iTask}                #last plan per task
+    
+    #initialize environment input
+    iEnv = [xObserve, xNoFind, xPossess, iSet, iRan, iInc, iStats, iResult, iPos, iTrial]
+    
+    #initialize planning 
+    yBelief = iPlanner['yBelief']                      #belief with minor abstraction, as items x locations
+    
+    while iContinue:
+        
+        tOpen = [x for x in iTask if tResult[x] != 1]       #tasks not done yet
+
+        #start plan timer
+        plan_t0     = time.perf_counter()
+        if startTime == '': startTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        #make plans (reasoning is shared, plans per task)
+        nPlanner += 1
+        pCache = iOpt['cache'] if nPlanner == 1 else None          #first round is the same for every seed and plans per replan
+        yPlan = make_plans(iPlanner, tOpen, yBelief, xObserve, xNoFind, xPossess, iPos, iRan, iStage, pCache)
+        
+        #labeled plans per task
+        for x in tOpen:
+            yPlan[x], temp = get_taskFrame(yPlan[x], x, id_item, pLoc, iPPR)
+            if temp is None: nNoPlan += 1
+        
+        #end plan timer
+        planTime += time.perf_counter() - plan_t0
+        
+        #run plans, column k of every open task along one route, without stopping at a failed location
+        run_t0 = time.perf_counter()
+        for k in range(iPPR):
+            tRun = [x for x in tOpen if tResult[x] != 1 and k < len(yPlan[x].columns)]
+            if len(tRun) == 0: break
+            iPlan = get_routePlan([yPlan[x].iloc[:,k] for x in tRun])
+            print('running trial {} ({} tasks)'.format(iTrial, len(tRun)))
+            iEnv = run(iEnv, iPlan, True)  
+            nRun +=1
+            print('nRun', nRun)
+            for x in tRun: 
+                tResult[x] = check_found(yPlan[x].iloc[:,k], iEnv[0], id_item)          #task result from what was seen on the route
+                tPlan[x] = [(a, b) for a, b in yPlan[x].iloc[:,k].items() if len(b)>0]
+            mcTime += iEnv[6][0]         #cummulative minecraft time
+            mcDist += iEnv[6][1]         #cummulative minecraft distance
+            if nRun == nRun_max: break
+        runTime += time.perf_counter() - run_t0
+        
+        #update pack
+        xObserve    = iEnv[0]
+        xNoFind     = iEnv[1]
+        xPossess    = iEnv[2]
+        iPos        = iEnv[8]
+        
+        if all(tResult[x] == 1 for x in iTask) or nRun == nRun_max: iContinue = False
+        
+        #prepare for re-plan OR write stats to file (one row per task)
+        if iContinue is True:  yBelief = revise(yBelief, xObserve, xNoFind, pLoc)                            
+        else: 
+            endTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            nObs = sum(len(x) for x in xObserve)
+            totTime = planTime + runTime
+            if iPlanner['pool'] is not None: iPlanner['pool'].shutdown()
+            if iOpt['prior'] is not None: prior_put(iOpt['prior'], iSet, list(id_item), xObserve, xNoFind)   #share what this trial learned
+            for x in iTask:
+                iOut = [iTrial, x, iAbs, iSet, iPPR, iInc, startTime, endTime, planTime/60, runTime/60, totTime/60, mcTime, mcDist, nObs, nPlanner, nNoPlan, nRun, tResult[x], tPlan[x]]
+                iOut = iOut + [iStage[y] for y in cStage]
+                q.put(iOut)
+            print('completed trial {} ({} tasks)'.format(iTrial, len(iTask)))
+            print(get_memoStats())
+            time.sleep(0.1)
+
 # =============================================================================
 # EXECUTION
 
@@ -188,6 +389,22 @@ if __name__ == '__main__':
     pAbs   = [0,1,2,None]       #type of abstraction (0=Sc, 1=Si, 2=Cl, None)
     pPPR   = [1,3,5]            #plans per replan
     pSet   = [0,1,2]            #location set number 
+    
+    #planner options (shared by all trials in the sweep)
+    pOpt   = {}
+    pOpt['ann'] = None          #approximate neighbors for reasoning (None = exact, or e.g. {'nBit': 12, 'nTable': 8, 'seed': 0})
+    pOpt['compact'] = None      #compact features (None = float64, or e.g. {'dtype': 'int8', 'nDim': 100, 'seed': 0})
+    pOpt['top'] = False         #enumerate only the best iPPR plans per level, best first (False = every combination)
+    pOpt['deadline'] = None     #seconds per level for best-first planning (None = plan every combination)
+    pOpt['guard'] = {'maxPlan': 1e6, 'maxByte': 1e9, 'policy': 'best', 'nBest': 100}   #plan budget per level, policy 'best', 'cap' or 'sample' (None = no limit)
+    pOpt['travel'] = None       #travel penalty in score (None = off, or e.g. {'weight': 0.5, 'scale': 500} with scale in map units)
+    pOpt['estimate'] = None     #order plans by estimated success per search waypoint (None = by score, or e.g. {'found': 3, 'fail': 5, 'walk': 10})
+                                #  replaces score order; with 'travel' on, expected walking (map units per 'walk' waypoint) adds to the cost instead of the score penalty
+    pOpt['prior'] = None        #cross-trial prior store per location set (None = isolated trials as in the paper, or e.g. {'dir': './output/prior', 'share': 0.5, 'min': 1})
+    pOpt['multi'] = None        #tasks per trial, merged into one route per mission (None = one task per trial)
+    pOpt['workers'] = 1         #threads per trial for the planning levels (1 = one level after another)
+    pOpt['incremental'] = False #replan only items whose locations changed (same plans as from scratch, but first-round plans are not disk cached)
+    pOpt['cache'] = {'dir': './output/cache'}   #disk cache of deterministic planning work (None = off; keyed by input files and planner code)
 
     print('Agent loading inputs....')
     print('\t COMPLETE parameters from user.')
@@ -215,12 +432,23 @@ if __name__ == '__main__':
     df_recipe = df_recipe.set_index('id_item')
     print('\t COMPLETE recipes from minecraft.')
     
+    #hash inputs and planner code (disk cache entries are only reused for identical files and code)
+    if pOpt['cache'] is not None: 
+        pOpt['cache']['src'] = [get_fileHash(x) for x in ['utils/conceptnet.xlsx', 'utils/truth.xlsx', 'utils/numberbatch.h5', 'models/construal.py', 'models/store.py']]
+        print('\t COMPLETE hashing inputs for cache.')
+    
     #compute descriptive matricies
-    mRecipe   = get_recipeMatrix(id_item, df_recipe)
+    mRecipe   = disk_call(pOpt['cache'], 'recipe', [list(id_item)], get_recipeMatrix, id_item, df_recipe)
     mFeature  = get_featureMatrix(id_uri, df_embed)
+    if pOpt['compact'] is not None: mFeature = get_compactMatrix(mFeature, pOpt['compact'])
     del df_recipe, df_embed
     print('\t COMPLETE descriptive matricies.')
     
+    #share read-only inputs (written once, attached by each trial)
+    mTravel = get_travelTable() if pOpt['travel'] is not None else None     #walking distance between locations, from the maze
+    pShare = share_arrays(tempfile.mkdtemp(prefix = 'clt-share-'), {'id_item': id_item, 'id_uri': id_uri, 'mRecipe': mRecipe, 'mFeature': np.asarray(mFeature), 'mTravel': mTravel})
+    print('\t COMPLETE sharing inputs.')
+    
     #pack for multiprocessing
     iTrial   = 0                  #trial no.
     iStats   = (0,0)              #stats per trial
@@ -228,12 +456,14 @@ if __name__ == '__main__':
     iPos     = (0,0,90)           #start position (needed for next attempt within trial)
     iRan     = 0                  #degree of randomness on map
     testPack = []
+    if pOpt['multi'] is not None: pTask = [pTask[i:i+pOpt['multi']] for i in range(0, len(pTask), pOpt['multi'])]    #groups of tasks per trial
+    pTrial = trial if pOpt['multi'] is None else trial_multi
     for iTask in pTask:                         #SWEEP (task item)
         for iAbs in pAbs:                       #SWEEP (abstraction type)
             for iSet in pSet:                   #SWEEP (location set)     
                 for iPPR in pPPR:               #SWEEP (plans per replan)
                     for iInc in range(pInc):    #SWEEP (increment, random seed) 
-                        iInput = [iTrial, iTask, iAbs, iSet, iPPR, iInc, id_item, id_uri, mRecipe, mFeature]
+                        iInput = [iTrial, iTask, iAbs, iSet, iPPR, iInc, pShare, pOpt]
                         testPack.append(iInput)
                         iTrial+=1            
     print('\t COMPLETE compiling test pack.')
@@ -251,7 +481,7 @@ if __name__ == '__main__':
     pHandle = []
     
     for i in range(nProcs):
-        pHandle.append(Process(target=trial, args=(q,testPack[0])))
+        pHandle.append(Process(target=pTrial, args=(q,testPack[0])))
         testPack.pop(0)
         pHandle[-1].start()
     
@@ -261,15 +491,17 @@ if __name__ == '__main__':
         
         for i in range(s):
             if len(testPack):
-                pHandle.append(Process(target=trial, args=(q,testPack[0])))
+                pHandle.append(Process(target=pTrial, args=(q,testPack[0])))
                 testPack.pop(0)
                 pHandle[-1].start()
         
         while q.qsize()> 0:
             singleResult = q.get()
             totalResult.append(singleResult)
-            df = pd.DataFrame(totalResult, columns = ['trial', 'task', 'abstraction type', 'item set', 'plans per replan', 'seed', 'tsStart', 'tsEnd','plan time (min)', 'run time (min)', 'total time (min)', 'run time (minecraft ticks)', 'distance (minecraft units)', 'observations', 'nPS', 'nRunNP', 'nRun', 'result', 'lastPlan'])
+            df = pd.DataFrame(totalResult, columns = ['trial', 'task', 'abstraction type', 'item set', 'plans per replan', 'seed', 'tsStart', 'tsEnd','plan time (min)', 'run time (min)', 'total time (min)', 'run time (minecraft ticks)', 'distance (minecraft units)', 'observations', 'nPS', 'nRunNP', 'nRun', 'result', 'lastPlan'] + cStage)
             df.to_excel(filename) 
+    
+    shutil.rmtree(pShare['dir'], ignore_errors = True)
 
 # =============================================================================
 
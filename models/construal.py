@@ -12,7 +12,30 @@ import itertools
 import numpy as np
 import itertools as it
 import random
+import heapq
+import hashlib
+import time
 from scipy.spatial import distance
+from scipy import sparse
+from models.store import get_memo, memo_get, memo_put, memo_clear, get_memoReport, get_key
+
+#cache of item distance matrices (keyed by feature matrix fingerprint)
+_cache_similar = {}
+
+#memo of items needed per make level (keyed by recipe matrix fingerprint and task)
+_memo_recipe = get_memo(1024)
+
+#memo of beliefs per level (keyed by belief, features and abstraction settings)
+_memo_reason = get_memo(64)
+
+#memo of scaling tables (keyed by source file, set and levels)
+_memo_scaling = get_memo(16)
+
+#memo of plans (keyed by belief, possession, task and level; bounded by bytes too, as guarded containers can be large)
+_memo_plan = get_memo(32, 2.5e8)
+
+#cache of approximate neighbor indices (keyed by feature matrix fingerprint and index settings)
+_cache_ann = {}
 
 #subfunction of many functions (return distance between vectors)
 def get_vecDistance(x1, x2, distance_metric):
@@ -23,26 +46,22 @@ def get_vecDistance(x1, x2, distance_metric):
     elif distance_metric == 'cosine': 
         return distance.cosine(x1,x2)
 
-#function (return matrix representation of items and constituents)    
+#function (return sparse matrix representation of items and constituents)    
 def get_recipeMatrix(id_item, df_recipe):
-    nitem = len(df_recipe)
-    ans = np.zeros((nitem, nitem))
-    id = [x for x in df_recipe.index.values]
+    nitem = len(id_item)
+    iitem = pd.Series(range(nitem), index = id_item)
+    iitem = iitem[~iitem.index.duplicated()]            #first occurrence, as with list.index
     cols = ['c0', 'c1', 'c2', 'c3', 'c4']
     counts = ['n0', 'n1', 'n2', 'n3', 'n4']
+    ix = df_recipe.index.map(iitem).values
+    temp = []
     for i in range(len(cols)):
-        col = cols[i]
-        count = counts[i]
-        val = [x for x in df_recipe[col].values]
-        countVal = [x for x in df_recipe[count].values]
-        for j in range(nitem):
-            tempID = id[j]
-            tempVal = val[j]
-            tempCount = countVal[j]
-            if tempVal in id_item: 
-                ix = id_item.index(tempID)
-                iy = id_item.index(tempVal)
-                ans[ix,iy] = tempCount
+        iy = df_recipe[cols[i]].map(iitem).values
+        temp.append(pd.DataFrame({'ix': ix, 'iy': iy, 'n': df_recipe[counts[i]].values}))
+    temp = pd.concat(temp).dropna(subset = ['ix', 'iy'])
+    temp = temp.drop_duplicates(subset = ['ix', 'iy'], keep = 'last')     #later constituent columns overwrite earlier ones
+    temp = temp[pd.to_numeric(temp.n) != 0]
+    ans = sparse.csr_matrix((pd.to_numeric(temp.n).values.astype(float), (temp.ix.values.astype(int), temp.iy.values.astype(int))), shape = (nitem, nitem))
     return ans
 
 #function (return matrix representation of items and features)    
@@ -55,129 +74,296 @@ def get_featureMatrix(id_uri, df_embed):
     ans = np.matrix(ans)
     return ans    
 
+#function (return compact feature matrix, optionally projected to fewer dimensions and stored as int8/float16)
+def get_compactMatrix(matFeature, pCompact):
+    data = np.asarray(matFeature)
+    nDim = pCompact.get('nDim', None)
+    dtype = pCompact.get('dtype', 'int8')
+    if nDim is not None and nDim < data.shape[1]:
+        rng = np.random.RandomState(pCompact.get('seed', 0))
+        proj = rng.randn(data.shape[1], nDim) / np.sqrt(nDim)   #fixed random projection (preserves angles)
+        data = np.matmul(data.astype(float), proj)
+    if dtype == 'float16': 
+        ans = data.astype(np.float16)
+    elif data.dtype == np.int8: 
+        ans = data.copy()                                       #numberbatch mini is already quantized
+    else:
+        scale = np.max(np.abs(data)) / 127                      #single scale keeps relative magnitudes for centroids
+        if scale == 0: scale = 1
+        ans = np.round(data / scale).astype(np.int8)
+    return ans
+
+#subfunction of many functions (return dtype used for distance math, single precision for compact features)
+def get_workType(matFeature):
+    if np.asarray(matFeature).dtype.itemsize <= 2: ans = np.float32
+    else: ans = float
+    return ans
+
+#subfunction of many functions (return fingerprint of an array, used as cache key)
+def get_fingerprint(a):
+    a = np.ascontiguousarray(a)
+    ans = hashlib.sha1(str((a.shape, a.dtype.str)).encode())
+    ans.update(a.data)
+    return ans.hexdigest()
+
+#subfunction of get_distMatrix (return feature matrix with unit-length rows)
+def get_normMatrix(matFeature):
+    data = np.asarray(matFeature, dtype = get_workType(matFeature))
+    norm = np.linalg.norm(data, axis = 1, keepdims = True)
+    norm[norm == 0] = np.nan            #cosine distance undefined for zero vectors
+    ans = data / norm
+    return ans
+
+#function (return symmetric matrix of cosine distance between items, cached per feature matrix)
+def get_distMatrix(matFeature):
+    key = get_fingerprint(matFeature)
+    if key in _cache_similar: return _cache_similar[key]
+    data = get_normMatrix(matFeature)
+    ans = 1 - np.matmul(data, data.T)   #single matmul for all item pairs
+    ans = np.clip(ans, 0, 2)
+    ans = np.round(ans, 3)
+    if len(_cache_similar) >= 4: _cache_similar.pop(next(iter(_cache_similar)))
+    _cache_similar[key] = ans
+    return ans
+
 #function (return matrix representation of distance between items)
 def get_cosineMatrix(matFeature):
-    nitem = len(matFeature)
-    ans = np.zeros((nitem, nitem))
-    for i in range(nitem):
-        for j in range(nitem):
-            if i < j:
-                a = matFeature[i]
-                b = matFeature[j]
-                c = get_vecDistance(a,b, 'cosine')
-                ans[i,j] = np.round(c,3)
-            else:
-                ans[i,j] = None
+    ans = get_distMatrix(matFeature).copy()
+    ans[np.tril_indices(len(ans))] = None
     return ans        
 
 #function (return matrix representation of items and believed locations)   
 def get_locationMatrix(yBelief, pLoc):
+    if isinstance(yBelief, np.ndarray): return yBelief      #already items x locations (no copy)
     nitem = len(yBelief)
-    nloc = len(pLoc)
-    ans = np.zeros((nitem, nloc))
-    for i in range(nitem):
-        ntemp = len(yBelief[i])
-        for j in range(ntemp):
-            temploc = yBelief[i][j]
-            iloc = pLoc.index(temploc)
-            ans[i][iloc] = 1
+    iloc = {pLoc[j]: j for j in range(len(pLoc))}
+    ans = np.zeros((nitem, len(pLoc)), dtype = bool)
+    row = [i for i in range(nitem) for x in yBelief[i] if x in iloc]
+    col = [iloc[x] for i in range(nitem) for x in yBelief[i] if x in iloc]
+    ans[row, col] = True
     return ans         
 
 #subfunction of abstract_similar (return matrix of distances with max distance filter applied) 
 def get_filterMatrix(matCosine, maxDist):
-    ans = np.copy(matCosine)
-    for i in range(len(ans)):
-        for j in range(len(ans)):
-            temp = ans[i,j]
-            if i == j: ans[i,j] = 1
-            elif np.isnan(temp) == True: ans[i,j] = 0
-            elif temp > maxDist: ans[i,j] = 0
-            else: ans[i,j] = 1
+    ans = np.less_equal(matCosine, maxDist).astype(float)  #nan (lower triangle) compares False
+    np.fill_diagonal(ans, 1)
+    return ans
+
+#subfunction of abstract_similar (return locations named in a belief, in a fixed order, or None for a matrix belief)
+def get_beliefLoc(yBelief):
+    if isinstance(yBelief, np.ndarray): return None
+    ans = sorted(set(x for y in yBelief for x in y))
+    return ans
+
+#subfunction of abstract_similar (return belief lists from matrix representation, or the matrix if pLoc is None)
+def get_beliefList(matLocation, pLoc):
+    if pLoc is None: return matLocation
+    ans = [[pLoc[j] for j in np.flatnonzero(x)] for x in matLocation]
     return ans
 
+#subfunction of get_annIndex (return integer bucket code per row and table, from random hyperplanes)
+def get_annCode(data, planes):
+    data = np.nan_to_num(data)
+    bits = np.matmul(data, planes) > 0                  #table x row x bit
+    ans = np.matmul(bits, 1 << np.arange(planes.shape[2], dtype = np.int64))
+    return ans
+
+#function (return random-projection LSH index of feature rows, cached per feature matrix)
+def get_annIndex(matFeature, pAnn):
+    nBit = pAnn.get('nBit', 12)
+    nTable = pAnn.get('nTable', 8)
+    seed = pAnn.get('seed', 0)
+    key = (get_fingerprint(matFeature), nBit, nTable, seed)
+    if key in _cache_ann: return _cache_ann[key]
+    data = get_normMatrix(matFeature)
+    rng = np.random.RandomState(seed)
+    planes = rng.randn(nTable, data.shape[1], nBit)
+    code = get_annCode(data, planes)
+    
+    #candidate pairs (i<j) share a bucket in at least one table
+    nitem = len(data)
+    pair = []
+    for t in range(nTable):
+        order = np.argsort(code[t], kind = 'stable')
+        start = np.flatnonzero(np.diff(code[t][order], prepend = -1))
+        size = np.diff(np.append(start, nitem))
+        for n in np.unique(size[size>1]):
+            group = order[start[size==n][:,None] + np.arange(n)]
+            iu, ju = np.triu_indices(n, 1)
+            i = np.minimum(group[:,iu], group[:,ju]).ravel()
+            j = np.maximum(group[:,iu], group[:,ju]).ravel()
+            pair.append(i * nitem + j)
+    pair = np.unique(np.concatenate(pair)) if len(pair)>0 else np.empty(0, dtype = np.int64)
+    i = pair // nitem
+    j = pair % nitem
+    
+    #exact distance for candidate pairs only
+    d = 1 - np.einsum('ij,ij->i', data[i], data[j])
+    d = np.round(np.clip(d, 0, 2), 3)
+    ans = {'data': data, 'planes': planes, 'code': code, 'i': i, 'j': j, 'dist': d}
+    if len(_cache_ann) >= 4: _cache_ann.pop(next(iter(_cache_ann)))
+    _cache_ann[key] = ans
+    return ans
+
+#subfunction of abstract_cluster (return approximate item x centroid pairs within maxDist)
+def get_annMatch(index, cent, maxDist):
+    data = index['data']
+    planes = index['planes']
+    code = index['code']
+    codeCent = get_annCode(get_normMatrix(cent), planes)
+    pair = []
+    for t in range(len(planes)):
+        order = np.argsort(codeCent[t], kind = 'stable')
+        lo = np.searchsorted(codeCent[t][order], code[t], side = 'left')
+        hi = np.searchsorted(codeCent[t][order], code[t], side = 'right')
+        n = hi - lo
+        i = np.repeat(np.arange(len(data)), n)
+        j = order[np.repeat(lo, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)]
+        pair.append(i * len(cent) + j)
+    pair = np.unique(np.concatenate(pair))
+    i = pair // len(cent)
+    j = pair % len(cent)
+    d = np.round(1 - np.einsum('ij,ij->i', data[i], get_normMatrix(cent)[j]), 6)
+    ans = i[d <= maxDist]
+    return ans
+
+#subfunction of abstract_cluster (return cosine distance between each row of x and each row of c)
+def get_rowDistance(x, c):
+    ans = 1 - np.matmul(get_normMatrix(x), get_normMatrix(c).T)
+    ans = np.round(ans, 6)              #identical directions are exactly zero apart
+    return ans
+
+#subfunction of get_centroids (fold added items of one location into its centroids, in index order as the sequential pass)
+def update_centroids(model, ixAdd, data, maxDist):
+    for i in ixAdd:
+        x = data[i:i+1]
+        d = get_rowDistance(x, model['sum'])[0] if len(model['num'])>0 else np.empty(0)
+        ix = np.flatnonzero(d < maxDist)
+        if len(ix)==0:
+            model['sum'] = np.vstack([model['sum'], x])
+            model['num'] = np.append(model['num'], 1)
+            j = len(model['num']) - 1
+        else:
+            j = ix[np.argmin(d[ix])]
+            model['sum'][j] += x[0]
+            model['num'][j] += 1
+        model['member'][i] = j
+    return model
+
 #subfunction of abstract_cluster (returns centroids per all classes)
-def get_centroids(matLocation, matFeature, maxDist): 
-    data = matFeature.copy()
+def get_centroids(matLocation, matFeature, maxDist, pLoc = None, mCentroid = None): 
+    data = np.asarray(matFeature, dtype = get_workType(matFeature))
     nloc = len(matLocation[0])
+    if pLoc is None: pLoc = list(range(nloc))
+    if mCentroid is None: mCentroid = {}            #no model kept, so cluster from scratch
     totalCentroids = [[] for x in range(nloc)]
     for k in range(nloc):
-        ix = np.argwhere(matLocation[:,k] == 1)
-        ix = [int(x) for x in ix]
-        x_train = [data[i] for i in ix]
-        if len(x_train)>0:
-            centroids = [[0 for x in range(len(x_train[0]))]]
-            centroids[0] = x_train[0]
-            total_num = [1]
-            for i in range(1,len(x_train)):
-                distances=[]
-                indices = []
-                for j in range(0,len(centroids)):
-                    d = get_vecDistance(x_train[i], centroids[j], 'cosine')
-                    if d < maxDist:
-                        distances.append(d)
-                        indices.append(j)
-                if len(distances)==0:
-                    centroids.append(x_train[i])
-                    total_num.append(1)
-                else:
-                    min_d = np.argmin(distances)
-                    centroids[indices[min_d]] = np.add(np.multiply(total_num[indices[min_d]],centroids[indices[min_d]]),x_train[i])
-                    total_num[indices[min_d]]+=1
-                    centroids[indices[min_d]] = np.divide(centroids[indices[min_d]],(total_num[indices[min_d]]))
-        else:
-                centroids = []
-        
-        totalCentroids[k] = centroids
-    
+        key = (pLoc[k], maxDist)
+        if key not in mCentroid: 
+            mCentroid[key] = {'sum': np.empty((0, data.shape[1])), 'num': np.empty(0, dtype = int), 'member': {}}
+        model = mCentroid[key]
+        ix = set(np.flatnonzero(matLocation[:,k] == 1))
+        old = set(model['member'])
+        ixAdd = sorted(ix - old)
+        if len(old - ix)>0 or (len(ixAdd)>0 and len(old)>0 and ixAdd[0] < max(old)):
+            #removed or out-of-order items change earlier assignments of the sequential pass, so rebuild this location
+            model = mCentroid[key] = {'sum': np.empty((0, data.shape[1])), 'num': np.empty(0, dtype = int), 'member': {}}
+            ixAdd = sorted(ix)
+        if len(ixAdd)>0: update_centroids(model, ixAdd, data, maxDist)
+        totalCentroids[k] = model['sum'] / model['num'][:,None]
     return totalCentroids
  
 #function (return predicted locations based on similar items)   
-def abstract_similar(yBelief, matFeature, maxDist):
-    len_net = len(yBelief)
-    old_net = [x[:] for x in yBelief] #deepcopy
-    ans  = [[] for x in range(len_net)]
-    matCosine   = get_cosineMatrix(matFeature)
-    filt = get_filterMatrix(matCosine, maxDist)   
-    for i in range(len_net):
-        for j in range(len_net):  
-            if filt[i,j]==1: 
-                ans[i].extend(old_net[j])
-    ans = [list(set(x)) for x in ans]
+def abstract_similar(yBelief, matFeature, maxDist, pAnn = None):
+    if pAnn is not None: return abstract_similar_levels(yBelief, matFeature, [maxDist], pAnn)[0]
+    pLoc = get_beliefLoc(yBelief)
+    matLocation = get_locationMatrix(yBelief, pLoc)
+    matCosine = get_cosineMatrix(matFeature)
+    filt = get_filterMatrix(matCosine, maxDist)
+    ans = np.matmul(filt, matLocation) > 0  #merge beliefs of all neighbors at once
+    ans = get_beliefList(ans, pLoc)
+    return ans
+
+#function (return predicted locations based on similar items, for every level in one pass)
+def abstract_similar_levels(yBelief, matFeature, pModList, pAnn = None):
+    pLoc = get_beliefLoc(yBelief)
+    matLocation = get_locationMatrix(yBelief, pLoc) > 0
+    levels = np.unique(pModList)
+    nitem = len(matLocation)
+    nlev = len(levels)
+    if pAnn is not None: return abstract_similar_ann(matLocation, matFeature, pModList, pLoc, pAnn)
+    matCosine = get_cosineMatrix(matFeature)
+    
+    #lowest level at which each pair are neighbors (neighbor sets are nested by threshold)
+    levPair = np.searchsorted(levels, matCosine, side = 'left')
+    levPair[np.isnan(matCosine)] = nlev
+    np.fill_diagonal(levPair, 0)
+    
+    #lowest level at which each item borrows each location
+    levItem = np.full(matLocation.shape, nlev)
+    for k in range(matLocation.shape[1]):
+        ix = np.flatnonzero(matLocation[:,k])
+        if len(ix)>0: levItem[:,k] = levPair[:,ix].min(axis = 1)
+    
+    ans = []
+    for pMod in pModList:
+        ilev = np.searchsorted(levels, pMod)
+        temp = get_beliefList(levItem <= ilev, pLoc)
+        ans.append(temp)
+    return ans
+
+#subfunction of abstract_similar_levels (return predicted locations from approximate neighbor pairs)
+def abstract_similar_ann(matLocation, matFeature, pModList, pLoc, pAnn):
+    index = get_annIndex(matFeature, pAnn)
+    nitem = len(matLocation)
+    levels = np.unique(pModList)
+    merged = matLocation.copy()
+    lower = -np.inf
+    ansLevel = {}
+    for pMod in levels:
+        #only pairs that join at this level are merged (neighbor sets are nested by threshold)
+        ix = (index['dist'] > lower) & (index['dist'] <= pMod)
+        filt = sparse.csr_matrix((np.ones(ix.sum()), (index['i'][ix], index['j'][ix])), shape = (nitem, nitem))
+        merged = merged | (filt.dot(matLocation) > 0)
+        ansLevel[pMod] = merged.copy()
+        lower = pMod
+    ans = [get_beliefList(ansLevel[pMod], pLoc) for pMod in pModList]
     return ans
 
 #function (return predicted locations based on similar centroids)   
-def abstract_cluster(yBelief, matFeature, maxDist, pLoc):    
+def abstract_cluster(yBelief, matFeature, maxDist, pLoc, mCentroid = None, pAnn = None):    
     matLocation = get_locationMatrix(yBelief, pLoc)
-    centroids = get_centroids(matLocation, matFeature, maxDist)
+    centroids = get_centroids(matLocation, matFeature, maxDist, pLoc, mCentroid)
     nitem = len(yBelief)
     nloc = len(centroids)
-    ans  = [[] for x in range(nitem)]
-    data = matFeature.copy()    
-    for i in range(nitem):
-        for j in range(nloc):
-            ncent = len(centroids[j])
-            for k in range(ncent):  
-                d = get_vecDistance(data[i], centroids[j][k], 'cosine')
-                if d<=maxDist:
-                    loc = pLoc[j]
-                    ans[i].append(loc)
-    ans = [list(set(x)) for x in ans]
+    ans = np.zeros((nitem, nloc), dtype = bool)
+    if pAnn is not None: index = get_annIndex(matFeature, pAnn)
+    for j in range(nloc):
+        if len(centroids[j])>0 and pAnn is not None:
+            ans[get_annMatch(index, centroids[j], maxDist), j] = True
+        elif len(centroids[j])>0:
+            d = get_rowDistance(matFeature, centroids[j])
+            ans[:,j] = np.any(d <= maxDist, axis = 1)
+    if not isinstance(yBelief, np.ndarray): ans = get_beliefList(ans, pLoc)
     return ans
 
 #function (return predicted locations based on KG-related items)   
 def abstract_scaling(pMod, pSrc, iSet):
+    ans = abstract_scaling_levels([pMod], pSrc, iSet)[0]
+    return ans
+
+#function (return predicted locations based on KG-related items, for every level in one read)
+def abstract_scaling_levels(pModList, pSrc, iSet):
+    key = get_key(pSrc, iSet, list(pModList))
+    ans = memo_get(_memo_scaling, key)
+    if ans is not None: return ans
     abstract = pd.read_excel(pSrc, keep_default_na=False)
-    col = 'set' + str(iSet) + '_lev' + str(pMod)
-    ans = abstract[col].apply(eval)
-    # if pMod == 0:
-    #     ans = abstract.L0.apply(eval)
-    #     ans = list(ans)
-    # elif pMod == 1:
-    #     ans = abstract.L1.apply(eval)
-    #     ans = list(ans)
-    # elif pMod == 2:
-    #     ans = abstract.L2.apply(eval)
-    #     ans = list(ans)
+    ans = []
+    for pMod in pModList:
+        col = 'set' + str(iSet) + '_lev' + str(pMod)
+        temp = abstract[col].apply(eval)
+        ans.append(temp)
+    memo_put(_memo_scaling, key, ans)
     return ans
 
 #subfunction of plan (return item names based on their index)
@@ -195,268 +381,618 @@ def map_location(a, pLoc):
         else: ans.append(a[i])
     return ans
 
+#subfunction of get_plans (return items and candidate locations per item, or None if some item has no location)
+def get_candidates(mLocTest, xTest, xPossess = None):
+    nLoc = len(mLocTest) - 1                                #last location is 'self'
+    ix = np.flatnonzero(xTest == 1)
+    y = [[int(x) for x in np.flatnonzero(mLocTest[:,i] == 1)] for i in ix]
+    if any(len(x)==0 for x in y): return None          #checked before possession, as L does
+    if xPossess is not None: y = [[nLoc] if xPossess[i] > 0 else x for i, x in zip(ix, y)]
+    return ix, y
+
+#subfunction of L_top (yield location per item in best-first order, i.e. fewest distinct locations, until pStop['deadline'])
+def get_plans(mLocTest, xTest, xPossess = None, pStop = None):
+    nLoc = len(mLocTest) - 1                                #last location is 'self'
+    temp = get_candidates(mLocTest, xTest, xPossess)
+    if temp is None: return
+    ix, y = temp
+    
+    #assign the most constrained items first, then map back to item order
+    order = sorted(range(len(ix)), key = lambda k: len(y[k]))
+    y = [y[k] for k in order]
+    back = np.argsort(order)
+    
+    #lower bound on extra locations: one more if some remaining item has no candidate already chosen
+    def bound(depth, locs):
+        for k in range(depth, len(y)):
+            if not any(x in locs or x == nLoc for x in y[k]): return 1
+        return 0
+    
+    count = it.count()
+    heap = [(bound(0, frozenset()), 0, next(count), (), frozenset())]
+    while len(heap)>0:
+        if pStop is not None and time.perf_counter() > pStop['deadline']:
+            pStop['cut'] = True                             #unexplored plans remain
+            return
+        f, depth, _, assign, locs = heapq.heappop(heap)
+        depth = -depth
+        if depth == len(y):
+            yield ix, tuple(assign[k] for k in back)
+            continue
+        for loc in y[depth]:
+            temp = locs | {loc} if loc != nLoc else locs
+            g = len(temp)
+            heapq.heappush(heap, (g + bound(depth+1, temp), -(depth+1), next(count), assign + (loc,), temp))
+
+#subfunction of many functions (return plan container, i.e. item, location and plan id per entry)
+def get_planArray(item, loc, plan, nPlan):
+    ans = {}
+    ans['item'] = np.asarray(item, dtype = int)
+    ans['loc']  = np.asarray(loc, dtype = int)
+    ans['plan'] = np.asarray(plan, dtype = int)
+    ans['nPlan'] = int(nPlan)
+    return ans
+
+#subfunction of plan (return the nTop best locations from items, without building every combination)
+def L_top(mLocTest, xTest, xPossess, nTop):
+    a = []
+    ix = []
+    for ix, loc in get_plans(mLocTest, xTest, xPossess):
+        a.append(loc)
+        if len(a) == nTop: break
+    if len(a)==0:
+        #plan is empty (not enough location data)
+        ans = get_planArray([], [], [], 1)
+        return ans
+    nPlan = len(a)
+    ans = get_planArray(np.tile(ix, nPlan), np.ravel(a), np.repeat(np.arange(nPlan), len(ix)), nPlan)
+    ans['nProduct'] = get_productSize(mLocTest, xTest)
+    return ans
+
+#subfunction of many functions (return count of location combinations for items, i.e. size of the full product as L enumerates it)
+def get_productSize(mLocTest, xTest):
+    temp = get_candidates(mLocTest, xTest)
+    if temp is None: return 0
+    ans = int(np.prod([len(x) for x in temp[1]], dtype = object))
+    return ans
+
 #subfunction of plan (return locations from items using matrix math)
-def L(mLocTest, xTest):
-    ix = np.argwhere(xTest == 1)
-    y = [] 
-    for i in range(len(ix)):
-        xVec = np.zeros(len(xTest))
-        xVec[ix[i]] = 1
-        temp = np.matmul(mLocTest, xVec)
-        iy = np.argwhere(temp == 1)
-        y.append(iy)
-    y = [list(x) for x in y]
-    try:
-        y = [np.concatenate(x) for x in y]
-        a = list(it.product(*y))
-        ans = np.zeros((len(mLocTest), len(a)))  
-        ans = pd.DataFrame(ans)
-        
-        for i in range(len(ans.columns)):
-            ans[i] = np.empty((len(ans), 0)).tolist()
-       
-        for i in range(len(a)):
-            for j in range(len(a[0])):
-                id = ix[j][0]
-                loc = a[i][j]
-                ans.iloc[loc, i].append(id)
-                
-        for i in range(len(ans.columns)):
-            ans[i] = ans[i].apply(lambda x: np.array(x))
-    except:
-        #dataframe is empty (not enough location data)
-        ans = [[] for x in range(len(mLocTest))]
-        ans = pd.DataFrame(zip(ans))
+def L(mLocTest, xTest, xPossess = None, nTop = None):
+    if nTop is not None: return L_top(mLocTest, xTest, xPossess, nTop)
+    ix = np.flatnonzero(xTest == 1)
+    y = [np.flatnonzero(mLocTest[:,i] == 1) for i in ix]
+    n = [len(x) for x in y]
+    if 0 in n:
+        #plan is empty (not enough location data)
+        ans = get_planArray([], [], [], 1)
+        return ans
     
+    a = get_product(y)
+    nPlan = len(a)
+    ans = get_planArray(np.tile(ix, nPlan), a.ravel(), np.repeat(np.arange(nPlan), len(ix)), nPlan)
+    ans['nProduct'] = nPlan
+    return ans
+
+#subfunction of L (return cartesian product of candidate locations, one row per plan, in itertools.product order, first nRow rows only if given)
+def get_product(y, nRow = None):
+    n = [len(x) for x in y]
+    nPlan = int(np.prod(n, dtype = object)) if len(n)>0 else 1
+    if nRow is not None: nRow = min(nRow, nPlan)
+    else: nRow = nPlan
+    ans = np.empty((nRow, len(y)), dtype = int)
+    stride = nPlan
+    for k in range(len(y)):
+        stride = stride // n[k]
+        if stride >= nRow: ans[:,k] = y[k][0]                  #row index never reaches the next digit
+        else: ans[:,k] = np.asarray(y[k])[(np.arange(nRow) // stride) % n[k]]
+    return ans
+
+#subfunction of plan (return estimated bytes to enumerate and score nPlan plans of nItem items)
+def get_planBytes(nPlan, nItem):
+    ans = nPlan * max(nItem, 1) * 8 * 6         #item, loc and plan ids, product rows, and location count sort
+    return ans
+
+#subfunction of L_guard (return whether the full product of locations for items is over the pGuard plan or memory budget)
+def check_guard(mLocTest, xTest, pGuard):
+    if pGuard is None: return False
+    nPlan = get_productSize(mLocTest, xTest)
+    nItem = int(np.sum(xTest == 1))
+    ans = nPlan > pGuard.get('maxPlan', 1e6) or get_planBytes(nPlan, nItem) > pGuard.get('maxByte', 1e9)
+    return ans
+
+#subfunction of plan (return locations from items as L, unless the product is over the pGuard budget, then per pGuard['policy'])
+def L_guard(mLocTest, xTest, xPossess = None, nTop = None, pGuard = None):
+    if nTop is not None or not check_guard(mLocTest, xTest, pGuard): return L(mLocTest, xTest, xPossess, nTop)
+    
+    #over budget, enumerate part of the product only
+    nPlan = get_productSize(mLocTest, xTest)
+    nItem = int(np.sum(xTest == 1))
+    maxPlan = min(int(pGuard.get('maxPlan', 1e6)), int(pGuard.get('maxByte', 1e9) // get_planBytes(1, nItem)))
+    policy = pGuard.get('policy', 'best')
+    if policy == 'best':                                        #best plans of the same plan space as L (empty locations checked before possession)
+        ans = L_top(mLocTest, xTest, xPossess, min(maxPlan, pGuard.get('nBest', 100)))
+    else:
+        ix = np.flatnonzero(xTest == 1)
+        y = [np.flatnonzero(mLocTest[:,i] == 1) for i in ix]
+        if policy == 'cap': 
+            a = get_product(y, maxPlan)                         #first rows in product order
+        else:                                                   
+            rng = np.random.RandomState(pGuard.get('seed', 0))  #uniform sample of the product, duplicates are removed in review
+            a = np.stack([x[rng.randint(0, len(x), maxPlan)] for x in y], axis = 1) if len(y)>0 else np.empty((1, 0), dtype = int)
+        ans = get_planArray(np.tile(ix, len(a)), a.ravel(), np.repeat(np.arange(len(a)), len(ix)), len(a))
+    ans['nProduct'] = nPlan
+    ans['guard'] = True
     return ans
 
 #subfunction of plan (return recipe items from items using matrix math)
 def R(mRecTest, xTest):
     
     #use the matrix to find the ingredients
-    ans = np.matmul(mRecTest, xTest)
-    ans = [1 if x>0 else 0 for x in ans]
-    ans = np.array(ans)  
-    
-    #get the indicies of the new vector
-    ix = np.argwhere(ans >0)
-    ix = [x[0] for x in ix]
-    
-    #as long as something is returned, check out process 
-    if len(ix)>0:
-        checkIn = np.argwhere(xTest >0)     #initial items check in
-        checkIn = [x[0] for x in checkIn]
-        leftOver = checkIn.copy()           #initial items not accounted for 
-        checkOut = []                       #initial items accounted for
-        iy = np.argwhere(mRecTest[ix] >0)
-        iy = [x[1] for x in iy]
-        for i in range(len(iy)):
-            if iy[i] in leftOver:
-                leftOver.remove(iy[i])
-                checkOut.append(iy[i])
-        if len(leftOver)>0:                 #if there are items unaccounted for
-            for i in range(len(leftOver)):
-                temp_ix = leftOver[i]
-                ans[temp_ix] = 1            #add the unaccounted for items to the plan
-                
+    ans = (mRecTest.dot(xTest) > 0).astype(int)
+    
+    #as long as something is returned, carry over initial items that have no recipe
+    if ans.any():
+        hasRecipe = np.asarray(abs(mRecTest).sum(axis = 0)).ravel() > 0
+        ans[(xTest > 0) & ~hasRecipe] = 1
     else: ans = np.zeros(len(xTest))        
             
     return ans
 
+#subfunction of plan (return items needed per make level, i.e. items, R(items), R(R(items))..., cached per task)
+def get_recipeLevels(mRecipe, ix, pDepth = None):
+    key = get_key(mRecipe, ix)
+    ans = memo_get(_memo_recipe, key)
+    if ans is None:
+        mRecTest = sparse.csr_matrix(mRecipe).transpose().tocsr()
+        xTest = np.zeros(mRecTest.shape[0])
+        xTest[ix] = 1
+        ans = [xTest]
+        seen = {xTest.tobytes()}
+        while ans[-1].any():
+            xTest = R(mRecTest, xTest).astype(float)
+            if xTest.tobytes() in seen: break      #deeper levels would repeat (raw items, or block <-> ingot)
+            ans.append(xTest)
+            seen.add(xTest.tobytes())
+        memo_put(_memo_recipe, key, ans)
+    if pDepth is not None: ans = ans[:pDepth+1]
+    return ans
+
 #subfunction of plan (return whether plan function should continue onto next level, i.e. L(items), L(R(items))...)
 def check_continue(pX):
     ans = True
-    nX = len(pX.columns)
-    if nX == 1:
-        temp = [x for x in pX[0] if len(x)>0]
-        nTemp = len(temp)
-        if nTemp == 0: ans = False
+    if pX['nPlan'] == 1 and len(pX['item']) == 0: ans = False
     return ans
 
 #subfunction of plan (return location count in a given plan, used for scoring)
 def count_loc(pX, pLoc):   
-    nX = len(pX.columns)
     nLoc = len(pLoc)-1
-    ans = []
-    for i in range(nX):
-        n = 0
-        x = pX[i][0:nLoc]
-        for tempx in x: 
-            if len(tempx)>0: n+=1
-        ans.append(n)
+    ix = pX['loc'] < nLoc                               #'self' is not a location to visit
+    pair = np.unique(pX['plan'][ix] * len(pLoc) + pX['loc'][ix])
+    ans = np.bincount(pair // len(pLoc), minlength = pX['nPlan'])
     return ans
 
 #subfunction of plan (return plan minus any items currently possessed)
 def check_possession(pX, xPossess, pLoc):  
-    ixPoss = np.argwhere(np.array(xPossess) >0)
-    ixPoss = [x[0] for x in ixPoss]
-    ans = pX.copy(deep = True)
-    nX = len(ans.columns)
     nLoc = len(pLoc)-1
-    for i in range(nX):
-        for j in range(nLoc):
-            temp = list(ans[i][j])
-            for k in range(len(temp)):
-                if temp[k] in ixPoss: 
-                    ans[i][j] = ans[i][j][ans[i][j] != temp[k]]                    
-                    ans[i][nLoc] = np.append(ans[i][nLoc], temp[k])
-        ans[i][nLoc] = [int(x) for x in ans[i][nLoc]]
+    ans = dict(pX)
+    ix = np.asarray(xPossess)[pX['item']] > 0
+    ans['loc'] = np.where(ix, nLoc, pX['loc'])
+    return ans
+
+#subfunction of plan (return scores of plan options, optionally with a travel penalty in [0,1] of weight pWeight)
+def score(pen_make, pen_loc, pen_mod, pLoc, pen_travel = None, pWeight = 0):
+    pen_loc = np.asarray(pen_loc)
+    ans = (1-np.asarray(pen_make)/4) * (1-pen_loc/(18)) * (1-np.asarray(pen_mod)/3)
+    if pen_travel is not None: ans = ans * (1-pWeight*np.asarray(pen_travel))
+    ans = np.where(pen_loc == 0, 1.000, np.round(ans,3))
+    if ans.ndim == 0: ans = float(ans)
+    return ans
+
+#subfunction of many functions (return plans in the given order, renumbered from zero)
+def select_plans(pX, order):
+    order = np.asarray(order, dtype = int)
+    rank = np.full(pX['nPlan'], -1)
+    rank[order] = np.arange(len(order))
+    ix = np.flatnonzero(rank[pX['plan']] >= 0)
+    ix = ix[np.argsort(rank[pX['plan'][ix]], kind = 'stable')]
+    ans = get_planArray(pX['item'][ix], pX['loc'][ix], rank[pX['plan'][ix]], len(order))
+    for key in ['make', 'nloc', 'mod', 'travel', 'score', 'success', 'search', 'walk', 'value']:
+        if key in pX: ans[key] = pX[key][order]
     return ans
 
-#subfunction of plan (return scores of plan options)
-def score(pen_make, pen_loc, pen_mod, pLoc):
-    if pen_loc == 0: ans = 1.000
-    else: 
-        ans = (1-pen_make/4) * (1-pen_loc/(18)) * (1-pen_mod/3)
-        ans = round(ans,3)
+#subfunction of many functions (return one container holding all plans, numbered in sequence)
+def join_plans(pList):
+    offset = np.cumsum([0] + [x['nPlan'] for x in pList])
+    item = np.concatenate([x['item'] for x in pList])
+    loc = np.concatenate([x['loc'] for x in pList])
+    plan = np.concatenate([x['plan'] + offset[i] for i, x in enumerate(pList)])
+    ans = get_planArray(item, loc, plan, offset[-1])
+    for key in ['make', 'nloc', 'mod', 'travel', 'score', 'success', 'search', 'walk', 'value']:
+        if all(key in x for x in pList): ans[key] = np.concatenate([x[key] for x in pList])
     return ans
 
 #function (return plans given item info and predictions)
-def plan(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod):
+def plan(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod, pTop = None, pDepth = 4, pGuard = None):
     
     mLocation = get_locationMatrix(yBelief, pLoc)
+    key = get_key(mLocation, np.asarray(xPossess), mRecipe, list(id_item), list(pLoc), pTask, pMod, pTop, pDepth, pGuard)
+    ans = memo_get(_memo_plan, key)
+    if ans is not None: return dict(ans)
+    mLocTest = mLocation.transpose()
     
-    mLocTest = mLocation.copy().transpose()
-    mRecTest = mRecipe.copy().transpose()  
+    ix = id_item.index(pTask) 
+    xLevels = get_recipeLevels(mRecipe, ix, pDepth)
     
-    xTest = np.zeros(len(mRecTest))
+    p = []
+    for k in range(len(xLevels)):
+        pk  = L_guard(mLocTest, xLevels[k], xPossess, pTop, pGuard)
+        pk  = check_possession(pk, xPossess, pLoc)
+        con = check_continue(pk)
+        if not con: break                   #level has no plan (not enough location data)
+        if k > 0: print('p{}'.format(k), pk['nPlan'])
+        if pk.get('guard', False): print('\tguard p{}'.format(k), pk['nProduct'])
+        
+        # 'make' and 'loc' penalty per each plan
+        pk['make'] = np.zeros(pk['nPlan'], dtype = int)
+        pk['nloc'] = count_loc(pk, pLoc)
+        p.append(pk)
+    
+    p = finish_plans(p, pMod, pLoc)
+    memo_put(_memo_plan, key, p)
+    return dict(p)
+
+#subfunction of plan, plan_batch and plan_incremental (return the joined plans of all levels with product size, guard flag, 'mod' penalty and, unless pScore is False, total score)
+def finish_plans(p, pMod, pLoc, pScore = True):
+    nProduct = sum(x['nProduct'] for x in p)
+    guard = any(x.get('guard', False) for x in p)
+    if len(p)>0: p = join_plans(p)
+    else: p = get_planArray([], [], [], 0)
+    p['nProduct'] = nProduct
+    p['guard'] = guard
+    p['make'] = p.get('make', np.zeros(0, dtype = int))
+    p['nloc'] = p.get('nloc', np.zeros(0, dtype = int))
+    p['mod'] = np.full(p['nPlan'], pMod)
+    if pScore: p['score'] = score(p['make'], p['nloc'], p['mod'], pLoc)
+    return p
+
+#subfunction of plan_anytime (yield (score, level, items, locations) per plan of one make level, best first)
+def get_levelPlans(mLocTest, xTest, xPossess, pLoc, pMod, k, pStop):
+    nLoc = len(pLoc)-1
+    for ix, loc in get_plans(mLocTest, xTest, xPossess, pStop):
+        nloc = len(set(loc) - {nLoc})
+        yield score(0, nloc, pMod, pLoc), k, ix, loc
+
+#subfunction of plan_batch (return items needed per make level for every task column at once, as get_recipeLevels per task)
+def get_recipeBatch(mRecipe, mTask, pDepth = None):
+    mRecTest = sparse.csr_matrix(mRecipe).transpose().tocsr()
+    hasRecipe = np.asarray(abs(mRecTest).sum(axis = 0)).ravel() > 0
+    X = np.asarray(mTask, dtype = float).T                  #items x tasks
+    ans = [[X[:,t]] for t in range(X.shape[1])]
+    seen = [{X[:,t].tobytes()} for t in range(X.shape[1])]
+    active = np.flatnonzero(X.any(axis = 0))
+    depth = 0
+    while len(active)>0 and (pDepth is None or depth < pDepth):
+        Y = np.asarray(mRecTest.dot(X[:,active]) > 0, dtype = float)
+        carry = (X[:,active] > 0) & ~hasRecipe[:,None]
+        Y[carry & Y.any(axis = 0)] = 1                      #carry over items with no recipe, unless nothing is returned
+        keep = []
+        for c, t in enumerate(active):
+            x = Y[:,c]
+            if x.tobytes() in seen[t]: continue             #deeper levels would repeat
+            ans[t].append(x)
+            seen[t].add(x.tobytes())
+            if x.any(): keep.append(c)
+        X = np.zeros_like(X)
+        X[:,active[keep]] = Y[:,keep]
+        active = active[keep]
+        depth += 1
+    return ans
+
+#function (return plans per task for a task matrix (tasks x items) or list of task names, sharing work across tasks)
+def plan_batch(yBelief, xPossess, mRecipe, id_item, pLoc, mTask, pMod, pTop = None, pDepth = 4, pGuard = None):
+    mLocTest = get_locationMatrix(yBelief, pLoc).transpose()
+    if len(mTask)>0 and isinstance(mTask[0], str):
+        temp = np.zeros((len(mTask), len(id_item)))
+        temp[np.arange(len(mTask)), [id_item.index(x) for x in mTask]] = 1
+        mTask = temp
+    xLevels = get_recipeBatch(mRecipe, mTask, pDepth)
+    
+    #plans per distinct make level (tasks often share ingredients, e.g. planks or ingots)
+    level = {}
+    for x in [x for y in xLevels for x in y]:
+        key = x.tobytes()
+        if key in level: continue
+        pk  = L_guard(mLocTest, x, xPossess, pTop, pGuard)
+        pk  = check_possession(pk, xPossess, pLoc)
+        if not check_continue(pk): pk = None           #level has no plan (not enough location data)
+        else: 
+            pk['make'] = np.zeros(pk['nPlan'], dtype = int)
+            pk['nloc'] = count_loc(pk, pLoc)
+        level[key] = pk
+    
+    ans = []
+    for y in xLevels:
+        p = []
+        for x in y:
+            pk = level[x.tobytes()]
+            if pk is None: break
+            p.append(pk)
+        ans.append(finish_plans(p, pMod, pLoc, False))
+    
+    #total score, for all tasks in one pass
+    nloc = np.concatenate([p['nloc'] for p in ans]) if len(ans)>0 else np.zeros(0, dtype = int)
+    temp = score(np.zeros(len(nloc)), nloc, np.full(len(nloc), pMod), pLoc)
+    bound = np.cumsum([0] + [p['nPlan'] for p in ans])
+    for t in range(len(ans)):
+        ans[t]['score'] = np.atleast_1d(temp)[bound[t]:bound[t+1]]
+    return ans
+
+#function (return the pTop best plans found before pDeadline seconds pass, best first, and whether they are proven best)
+def plan_anytime(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod, pTop = None, pDeadline = 1.0, pDepth = 4):
+    pStop = {'deadline': time.perf_counter() + pDeadline, 'cut': False}
+    mLocTest = get_locationMatrix(yBelief, pLoc).transpose()
     ix = id_item.index(pTask) 
-    xTest[ix] = 1
+    xLevels = get_recipeLevels(mRecipe, ix, pDepth)
     
-    p0  = L(mLocTest, xTest)
-    p0  = check_possession(p0, xPossess, pLoc)
-    con = check_continue(p0)
-    n1 = n2 = n3 = n4 = 0 
-    n0 = len(p0.columns)
+    #levels up to the first one without a plan (not enough location data), as in plan
+    gen = []
+    nProduct = 0
+    for k in range(len(xLevels)):
+        if not xLevels[k].any() or get_candidates(mLocTest, xLevels[k], xPossess) is None: break
+        gen.append(get_levelPlans(mLocTest, xLevels[k], xPossess, pLoc, pMod, k, pStop))
+        nProduct += get_productSize(mLocTest, xLevels[k])
     
-    # 'make' penalty per each plan
-    temp = [0 for x in range(n0)]
-    temp = pd.Series(temp, index = p0.columns)
-    p0 = p0.append(temp, ignore_index=True)
+    #score only falls with more locations, so merging levels by score is best first overall (bound is admissible)
+    item, loc, plan, nloc = [], [], [], []
+    for val, k, ix, temp in heapq.merge(*gen, key = lambda x: -x[0]):
+        item.extend(ix)
+        loc.extend(temp)
+        plan.extend([len(nloc)] * len(ix))
+        nloc.append(len(set(temp) - {len(pLoc)-1}))
+        if pTop is not None and len(nloc) == pTop: break
     
-    # 'loc' penalty per each plan
-    temp = count_loc(p0, pLoc)
-    temp = pd.Series(temp, index = p0.columns)
-    p0 = p0.append(temp, ignore_index=True) 
+    ans = get_planArray(item, loc, plan, len(nloc))
+    ans['make'] = np.zeros(ans['nPlan'], dtype = int)
+    ans['nloc'] = np.asarray(nloc, dtype = int)
+    ans['mod'] = np.full(ans['nPlan'], pMod)
+    ans['score'] = score(ans['make'], ans['nloc'], ans['mod'], pLoc)
+    ans['optimal'] = not pStop['cut']                    #proven best over the plans plan() enumerates (same levels, candidates and possession rule)
+    ans['nProduct'] = nProduct
+    ans['guard'] = False
+    return ans
+
+#subfunction of plan_incremental (return distinct location count per row, not counting 'self')
+def get_rowLocCount(a, nLoc):
+    if a.shape[1] == 0: return np.zeros(len(a), dtype = int)
+    temp = np.sort(a, axis = 1)
+    ans = 1 + np.count_nonzero(np.diff(temp, axis = 1), axis = 1)
+    ans = ans - np.any(temp == nLoc, axis = 1)
+    return ans
+
+#subfunction of plan_incremental (return product rows of one level, reusing rows of the previous replan that are still valid)
+def get_productUpdate(y, old):
+    if old is None or len(old['y']) != len(y): return get_product(y), None
+    changed = [j for j in range(len(y)) if not np.array_equal(y[j], old['y'][j])]
+    if len(changed) == 0: return old['a'], np.arange(len(old['a']))
     
+    #old rows whose changed items are still at a candidate location
+    keep = np.ones(len(old['a']), dtype = bool)
+    for j in changed: keep &= np.isin(old['a'][:,j], y[j])
     
-    if con: 
-        p1 = L(mLocTest, R(mRecTest, xTest))
-        p1  = check_possession(p1, xPossess, pLoc)
-        con = check_continue(p1) 
-        
-        # 'make' penalty per each plan
-        n1 = len(p1.columns)      
-        temp = [0 for x in range(n1)]
-        temp = pd.Series(temp, index = p1.columns)
-        p1 = p1.append(temp, ignore_index=True)
-        
-        # 'loc' penalty per each plan
-        temp = count_loc(p1, pLoc)
-        temp = pd.Series(temp, index = p1.columns)
-        p1 = p1.append(temp, ignore_index=True)   
-        print('p1', n1)
-
-    if con: 
-        p2 = L(mLocTest, R(mRecTest, R(mRecTest, xTest)))
-        p2  = check_possession(p2, xPossess, pLoc)
-        con = check_continue(p2) 
-        
-        # 'make' penalty per each plan
-        n2 = len(p2.columns)      
-        temp = [0 for x in range(n2)]
-        temp = pd.Series(temp, index = p2.columns)
-        p2 = p2.append(temp, ignore_index=True)
-        
-        # 'loc' penalty per each plan
-        temp = count_loc(p2, pLoc)
-        temp = pd.Series(temp, index = p2.columns)
-        p2 = p2.append(temp, ignore_index=True)  
-        print('p2', n2)
+    #new rows, split so each is enumerated once: items before j keep old locations, item j takes a new one
+    part = [old['a'][keep]]
+    for t, j in enumerate(changed):
+        temp = list(y)
+        for jj in changed[:t]: temp[jj] = np.intersect1d(y[jj], old['y'][jj])
+        temp[j] = np.setdiff1d(y[j], old['y'][j])
+        if all(len(x)>0 for x in temp): part.append(get_product(temp))
+    a = np.concatenate(part)
+    
+    #place rows in product order (mixed-radix rank), as plan would enumerate them
+    rank = np.zeros(len(a), dtype = int)
+    stride = 1
+    for j in reversed(range(len(y))):
+        rank += np.searchsorted(y[j], a[:,j]) * stride
+        stride *= len(y[j])
+    ans = np.empty_like(a)
+    ans[rank] = a
+    src = np.full(len(a), -1)
+    src[rank[:keep.sum()]] = np.flatnonzero(keep)          #old row per new row, -1 if enumerated now
+    return ans, src
 
+#function (return plans as plan does, re-enumerating only items whose locations changed since the last call with pState)
+def plan_incremental(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod, pState, pTop = None, pDepth = 4, pGuard = None):
+    if pTop is not None: return plan(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod, pTop, pDepth, pGuard)
+    nLoc = len(pLoc)-1
+    mLocTest = get_locationMatrix(yBelief, pLoc).transpose()
+    ix = id_item.index(pTask) 
+    xLevels = get_recipeLevels(mRecipe, ix, pDepth)
+    if any(check_guard(mLocTest, x, pGuard) for x in xLevels):
+        pState.clear()                                  #over budget, the guarded plan does not keep full products
+        return plan(yBelief, xPossess, mRecipe, id_item, pLoc, pTask, pMod, pTop, pDepth, pGuard)
+    xPossess = np.asarray(xPossess)
+    if pState.get('task') != (pTask, pDepth): pState.clear()
+    pState['task'] = (pTask, pDepth)
+    
+    p = []
+    for k in range(len(xLevels)):
+        ix = np.flatnonzero(xLevels[k] == 1)
+        y = [np.flatnonzero(mLocTest[:,i] == 1) for i in ix]
+        if len(ix) == 0 or any(len(x)==0 for x in y): break     #level has no plan (not enough location data)
+        old = pState.get(k)
+        a, src = get_productUpdate(y, old)
         
-    if con: 
-        p3 = L(mLocTest, R(mRecTest, R(mRecTest, R(mRecTest, xTest))))
-        p3  = check_possession(p3, xPossess, pLoc)       
-        con = check_continue(p3) 
-        
-        # 'make' penalty per each plan
-        n3 = len(p3.columns)      
-        temp = [0 for x in range(n3)]
-        temp = pd.Series(temp, index = p3.columns)
-        p3 = p3.append(temp, ignore_index=True)
+        #possession, then location count (reused for kept rows when possession is unchanged)
+        held = xPossess[ix] > 0
+        aHeld = np.where(held, nLoc, a)
+        if src is not None and np.array_equal(held, old['held']):
+            nloc = np.empty(len(a), dtype = int)
+            reuse = src >= 0
+            nloc[reuse] = old['nloc'][src[reuse]]
+            nloc[~reuse] = get_rowLocCount(aHeld[~reuse], nLoc)
+        else: nloc = get_rowLocCount(aHeld, nLoc)
+        pState[k] = {'y': y, 'a': a, 'held': held, 'nloc': nloc}
+        if k > 0: print('p{}'.format(k), len(a))
         
-        # 'loc' penalty per each plan
-        temp = count_loc(p3, pLoc)
-        temp = pd.Series(temp, index = p3.columns)
-        p3 = p3.append(temp, ignore_index=True) 
-        print('p3', n3)
+        pk = get_planArray(np.tile(ix, len(a)), aHeld.ravel(), np.repeat(np.arange(len(a)), len(ix)), len(a))
+        pk['make'] = np.zeros(pk['nPlan'], dtype = int)
+        pk['nloc'] = nloc
+        pk['nProduct'] = len(a)
+        pk['guard'] = False
+        p.append(pk)
+    for k in [x for x in pState if x != 'task' and x >= len(p)]: del pState[k]
+    
+    return finish_plans(p, pMod, pLoc)
 
-        
-    if con: 
-        p4 = L(mLocTest, R(mRecTest, R(mRecTest, R(mRecTest, R(mRecTest, xTest)))))
-        p4 = check_possession(p4, xPossess, pLoc)
-        
-        # 'make' penalty per each plan
-        n4 = len(p4.columns)      
-        temp = [0 for x in range(n4)]
-        temp = pd.Series(temp, index = p4.columns)
-        p4 = p4.append(temp, ignore_index=True)
-        
-        # 'loc' penalty per each plan
-        temp = count_loc(p4, pLoc)
-        temp = pd.Series(temp, index = p4.columns)
-        p4 = p4.append(temp, ignore_index=True)    
-        print('p4', n4)
-
-    n = len(p0.columns)
-    p = p0.copy()
-        
-    if n1 > 0: 
-        p1 = p1.rename(columns=lambda x: x+n)
-        n += n1
-        p = p.join(p1)
-    if n2 > 0: 
-        p2 = p2.rename(columns=lambda x: x+n)
-        n += n2
-        p = p.join(p2)
-    if n3 > 0: 
-        p3 = p3.rename(columns=lambda x: x+n)
-        n += n3
-        p = p.join(p3)
-    if n4 > 0: 
-        p4 = p4.rename(columns=lambda x: x+n)
-        n += n4
-        p = p.join(p4)
-    
-    for i in range(len(p.columns)):
-        p[i] = p[i].apply(lambda x: map_items(x, id_item))
-        
-        
-    # 'mod' penalty per each plan
-    temp = [pMod for x in range(n)]
-    temp = pd.Series(temp, index = p.columns)
-    p = p.append(temp, ignore_index=True)
+#subfunction of score_travel (return walking distance per plan, visiting its locations in route order from the nearest, as run does)
+def get_routeCost(pX, iTravel):
+    order = iTravel['order']
+    nRoute = max(order.max() + 1, 1)
+    ix = order[pX['loc']] >= 0                                  #'self' is not visited
+    pair = np.unique(pX['plan'][ix] * nRoute + order[pX['loc'][ix]])
+    plan = pair // nRoute
+    back = np.full(nRoute, -1)
+    back[order[order >= 0]] = np.flatnonzero(order >= 0)
+    loc = back[pair % nRoute]
+    ans = np.zeros(pX['nPlan'])
+    if len(pair) == 0: return ans
+    
+    #edges to the next location in route order (the last one wraps to the first), per plan
+    first = np.flatnonzero(np.r_[True, plan[1:] != plan[:-1]])
+    last = np.r_[first[1:] - 1, len(plan) - 1]
+    nxt = np.arange(1, len(plan) + 1)
+    nxt[last] = first
+    edge = iTravel['loc'][loc, loc[nxt]]
+    
+    #start at the nearest location, so the edge into it is not walked
+    temp = np.lexsort((iTravel['near'][loc], plan))
+    start = temp[np.r_[True, plan[temp][1:] != plan[temp][:-1]]]
+    prv = np.arange(-1, len(plan) - 1)
+    prv[first] = last
+    ans[plan[start]] = iTravel['pos'][loc[start]] + np.bincount(plan, edge, minlength = pX['nPlan'])[plan[start]] - edge[prv[start]]
+    ans[np.isnan(ans)] = np.inf                                 #unreachable location
+    return ans
+
+#function (return plans rescored with travel from the current position, pTravel = {'weight', 'scale'} in map units)
+def score_travel(pX, pLoc, iTravel, pTravel):
+    ans = dict(pX)
+    ans['travel'] = get_routeCost(pX, iTravel)
+    pen_travel = np.minimum(ans['travel'] / pTravel.get('scale', 500), 1)
+    ans['score'] = score(pX['make'], pX['nloc'], pX['mod'], pLoc, pen_travel, pTravel.get('weight', 0.5))
+    ans['score'] = np.atleast_1d(ans['score'])
+    return ans
+
+#subfunction of get_placement (return share of items placed at a random location, as the alist choice of get_xz in malmo)
+def get_ranShare(pRan):
+    if   pRan == 0.33: ans = 1/3
+    elif pRan == 0.67: ans = 2/3
+    elif pRan == 1.00: ans = 1.0
+    else:              ans = 0.0
+    return ans
+
+#function (return probability of each item at each location, from the get_xz placement with the belief as prior over the similar location)
+def get_placement(yBelief, xNoFind, xObserve, pLoc, pRan):
+    nLoc = len(pLoc)-1
+    prior = get_locationMatrix(yBelief, pLoc)[:, :nLoc].astype(float)
+    prior[prior.sum(axis = 1) == 0] = 1                                 #no belief, the similar location could be any
+    prior = prior / prior.sum(axis = 1, keepdims = True)
+    r = get_ranShare(pRan)
+    ans = (1-r) * prior + r / nLoc                                      #similar location, or a random one (possibly the same)
+    ans = ans * ~get_locationMatrix(xNoFind, pLoc)[:, :nLoc]
+    seen = get_locationMatrix(xObserve, pLoc)[:, :nLoc]
+    ans = np.where(seen.any(axis = 1, keepdims = True), seen, ans)      #observed items are where they were seen
+    total = ans.sum(axis = 1, keepdims = True)
+    ans = np.divide(ans, total, out = np.zeros_like(ans), where = total > 0)
+    ans = np.column_stack([ans, np.zeros(len(ans))])                    #'self' column (possessed items are not placed)
+    return ans
+
+#function (return plans with success probability, expected search waypoints and walking, and value = success per waypoint, pEstimate = {'found', 'fail', 'walk'})
+def estimate_plans(pX, mPlace, iTravel = None, pEstimate = None):
+    pEstimate = {} if pEstimate is None else pEstimate
+    pFound = pEstimate.get('found', 3)                  #waypoints searched at a location whose items are all there (run searches C, N, E, S, W)
+    pFail = pEstimate.get('fail', 5)                    #waypoints searched at a location with an item missing, where run ends the plan
+    pWalk = pEstimate.get('walk', 10)                   #map units of walking that cost as much as one waypoint (used with travel info)
+    nLoc = mPlace.shape[1]
+    ans = dict(pX)
+    
+    #probability that all items of a plan at one location are there, per (plan, location)
+    ix = pX['loc'] < nLoc-1                             #'self' is not searched
+    pair, inv = np.unique(pX['plan'][ix] * nLoc + pX['loc'][ix], return_inverse = True)
+    found = np.ones(len(pair))
+    np.multiply.at(found, inv, np.asarray(mPlace)[pX['item'][ix], pX['loc'][ix]])
+    plan = pair // nLoc
+    loc = pair % nLoc
+    if len(pair) == 0:                                  #nothing to search (no plans, or all items possessed)
+        ans['success'] = np.ones(pX['nPlan'])
+        ans['search'] = np.zeros(pX['nPlan'])
+        ans['walk'] = np.zeros(pX['nPlan'])
+        ans['value'] = np.round(ans['success'], 6)
+        return ans
+    
+    #visit order per plan, route order from the nearest location as run does (location order without travel info)
+    if iTravel is None: order, near = np.arange(nLoc), np.zeros(nLoc)
+    else: order, near = iTravel['order'], iTravel['near']
+    nRoute = max(order.max() + 1, 1)
+    temp = np.lexsort((near[loc], plan))
+    temp = temp[np.r_[True, plan[temp][1:] != plan[temp][:-1]]]
+    start = np.zeros(pX['nPlan'], dtype = int)
+    start[plan[temp]] = order[loc[temp]]
+    rank = (order[loc] - start[plan]) % nRoute
+    temp = np.lexsort((rank, plan))
+    plan, found, loc = plan[temp], found[temp], loc[temp]
     
-    #total score per each plan
+    #chance to reach each location (earlier ones all found), as a plans x locations table
+    first = np.searchsorted(plan, np.arange(pX['nPlan']))
+    col = np.arange(len(plan)) - first[plan]
+    nCol = col.max() + 1
+    mFound = np.ones((pX['nPlan'], nCol))
+    mFound[plan, col] = found
+    mUsed = np.zeros((pX['nPlan'], nCol), dtype = bool)
+    mUsed[plan, col] = True
+    mReach = np.cumprod(np.column_stack([np.ones(pX['nPlan']), mFound]), axis = 1)
+    
+    ans['success'] = mReach[:, -1]
+    ans['search'] = np.sum(mUsed * mReach[:, :-1] * (mFound * pFound + (1-mFound) * pFail), axis = 1)
+    
+    #expected walking, each leg taken only if the location it leads to is reached (from the position to the first)
+    ans['walk'] = np.zeros(pX['nPlan'])
+    if iTravel is not None:
+        leg = np.where(col == 0, iTravel['pos'][loc], iTravel['loc'][loc[np.maximum(np.arange(len(loc)) - 1, 0)], loc])
+        leg = np.where(np.isnan(leg), np.inf, leg)                                  #unreachable location
+        reach = mReach[plan, col]
+        np.add.at(ans['walk'], plan, np.where(reach > 0, reach * np.where(reach > 0, leg, 0), 0))
+    cost = ans['search'] + ans['walk'] / pWalk
+    ans['value'] = np.round(ans['success'] / np.maximum(cost, 1), 6)
+    return ans
+
+#function (return labeled plans, one column per plan and one row per location, used by run)
+def get_planFrame(pX, id_item, pLoc):
     nLoc = len(pLoc)
-    pT = p.T
-    pT[nLoc+3] = pT.apply(lambda x: score(x[nLoc], x[nLoc+1], x[nLoc+2], pLoc), axis=1)
-    p = pT.T
-      
-    old_index = p.index.values.tolist()
-    old_index[nLoc]   = 'penalty_make'
-    old_index[nLoc+1] = 'penalty_loc'
-    old_index[nLoc+2] = 'penalty_mod'
-    old_index[nLoc+3] = 'score'
-
-    new_index = map_location(old_index, pLoc)
-    new_index = pd.Series(new_index)
-    p = p.set_index(new_index)
-    p = p.rename(columns=lambda x: 'P'+ str(x))
-    p = p.iloc[:, :-1]
-    
-    return p    
+    cell = [[[] for i in range(pX['nPlan'])] for j in range(nLoc)]
+    for i, j, k in zip(pX['plan'], pX['loc'], pX['item']): cell[j][i].append(k)
+    cell = [[map_items(x, id_item) for x in y] for y in cell]
+    cell.append(pX['make'].tolist())
+    cell.append(pX['nloc'].tolist())
+    cell.append(pX['mod'].tolist())
+    cell.append(pX['score'].tolist())
+    index = map_location(list(range(nLoc)) + ['penalty_make', 'penalty_loc', 'penalty_mod', 'score'], pLoc)
+    ans = pd.DataFrame(cell, index = index, columns = ['P' + str(x) for x in range(pX['nPlan'])])
+    return ans
+
+#function (return one plan for run from labeled plans of several tasks, i.e. their items merged per location)
+def get_routePlan(planList):
+    ans = pd.Series([[] for i in range(len(planList[0]))], index = planList[0].index, dtype = object)
+    for iPlan in planList: 
+        for sLoc in iPlan.index: ans[sLoc] = sorted(set(ans[sLoc]) | set(iPlan[sLoc]))
+    return ans
+
+#function (return 1 if every item of a labeled plan was observed at its planned location, else -1, i.e. the task result of a merged run)
+def check_found(iPlan, xObserve, id_item):
+    ans = 1
+    for sLoc in iPlan.index:
+        for x in iPlan[sLoc]:
+            if sLoc not in xObserve[id_item.index(x)]: ans = -1
+    return ans
 
 #function (return sparse initial item locations)
 def guess(id_item, id_uri, pLoc, pSrc, iSet):
@@ -467,53 +1003,154 @@ def guess(id_item, id_uri, pLoc, pSrc, iSet):
     return ans
 
 #function (return item locations per abstraction type and level)
-def reason(yBelief, matFeature, pLoc, pAbs, pSrc, pMod, iSet):
-    if pAbs == 0:   ans = abstract_scaling(pMod, pSrc, iSet)  
-    elif pAbs == 1: ans = abstract_similar(yBelief, matFeature, pMod)
-    elif pAbs == 2: ans = abstract_cluster(yBelief, matFeature, pMod, pLoc)
-    elif pAbs is None:  ans = yBelief
+def reason(yBelief, matFeature, pLoc, pAbs, pSrc, pMod, iSet, mCentroid = None, pAnn = None):
+    ans = reason_levels(yBelief, matFeature, pLoc, pAbs, pSrc, [pMod], iSet, mCentroid, pAnn)
+    if len(ans)>0: ans = ans[0]
+    return ans    
+
+#function (return item locations per abstraction type, one belief per level in pModList)
+def reason_levels(yBelief, matFeature, pLoc, pAbs, pSrc, pModList, iSet, mCentroid = None, pAnn = None):
+    key = get_key(yBelief, matFeature, list(pLoc), pAbs, pSrc, list(pModList), iSet, pAnn)
+    temp = memo_get(_memo_reason, key)
+    if temp is not None: 
+        if mCentroid is not None: mCentroid.update(get_centroidCopy(temp[1]))    #restore the centroid model the beliefs were made with
+        return list(temp[0])
+    if pAbs == 0:   
+        ans = abstract_scaling_levels(pModList, pSrc, iSet)
+        if isinstance(yBelief, np.ndarray): ans = [get_locationMatrix(x, pLoc) for x in ans]
+    elif pAbs == 1: ans = abstract_similar_levels(yBelief, matFeature, pModList, pAnn)
+    elif pAbs == 2: ans = [abstract_cluster(yBelief, matFeature, pMod, pLoc, mCentroid, pAnn) for pMod in pModList]
+    elif pAbs is None:  ans = [yBelief for pMod in pModList]
     else:
         ans = []
         print('please input appropriate abstraction type.')
-    return ans    
+    memo_put(_memo_reason, key, [ans, get_centroidCopy(mCentroid, pModList)])
+    return list(ans)
+
+#subfunction of reason_levels (return deep copy of the centroid model, only the entries of levels in pModList if given)
+def get_centroidCopy(mCentroid, pModList = None):
+    if mCentroid is None: return {}
+    ans = {}
+    for k, v in mCentroid.items():
+        if pModList is not None and k[1] not in pModList: continue
+        ans[k] = {'sum': v['sum'].copy(), 'num': v['num'].copy(), 'member': dict(v['member'])}
+    return ans
+
+#function (return beliefs per level as reason_levels, with a copy of the centroid model they left, so disk-cached results restore the model)
+def reason_model(yBelief, matFeature, pLoc, pAbs, pSrc, pModList, iSet, mCentroid = None, pAnn = None):
+    ans = reason_levels(yBelief, matFeature, pLoc, pAbs, pSrc, pModList, iSet, mCentroid, pAnn)
+    ans = [ans, get_centroidCopy(mCentroid, pModList)]
+    return ans
+
+#function (return nothing after emptying the construal caches and memos, e.g. before timing)
+def clear_memos():
+    _cache_similar.clear()
+    _cache_ann.clear()
+    for memo in [_memo_reason, _memo_scaling, _memo_plan, _memo_recipe]: memo_clear(memo)
+    return None
+
+#function (return hit/miss counters of the construal memos)
+def get_memoStats():
+    ans = get_memoReport({'reason': _memo_reason, 'scaling': _memo_scaling, 'plan': _memo_plan, 'recipe': _memo_recipe})
+    return ans
+
+#function (return recall and accuracy of approximate reasoning against the exact path, per level)
+def get_annReport(yBelief, matFeature, pLoc, pAbs, pModList, pAnn):
+    _cache_similar.clear()
+    memo_clear(_memo_reason)
+    t0 = time.perf_counter()
+    exact = reason_levels(yBelief, matFeature, pLoc, pAbs, None, pModList, None)
+    t1 = time.perf_counter()
+    _cache_ann.clear()
+    approx = reason_levels(yBelief, matFeature, pLoc, pAbs, None, pModList, None, pAnn = pAnn)
+    t2 = time.perf_counter()
+    if pAbs == 1: 
+        matCosine = get_cosineMatrix(matFeature)
+        index = get_annIndex(matFeature, pAnn)
+    ans = []
+    for k in range(len(pModList)):
+        pMod = pModList[k]
+        mExact = get_locationMatrix(exact[k], pLoc) > 0
+        mApprox = get_locationMatrix(approx[k], pLoc) > 0
+        nHit = np.sum(mExact & mApprox)
+        recall = nHit / max(np.sum(mExact), 1)
+        precision = nHit / max(np.sum(mApprox), 1)
+        accuracy = np.mean(np.all(mExact == mApprox, axis = 1))     #items with identical location sets
+        if pAbs == 1:
+            nPair = np.sum(matCosine <= pMod)
+            pairRecall = np.sum(index['dist'] <= pMod) / nPair if nPair > 0 else np.nan
+        else: pairRecall = np.nan
+        ans.append([pAbs, pMod, pAnn.get('nBit', 12), pAnn.get('nTable', 8), pairRecall, recall, precision, accuracy, t1-t0, t2-t1])
+    ans = pd.DataFrame(ans, columns = ['abstraction type', 'level', 'nBit', 'nTable', 'pair recall', 'recall', 'precision', 'accuracy', 'exact time (s)', 'ann time (s)'])
+    return ans
+
+#function (return agreement of reasoning on compact features against the float64 path, per level)
+def get_compactReport(yBelief, matFeature, matCompact, pLoc, pAbs, pModList):
+    _cache_similar.clear()
+    memo_clear(_memo_reason)
+    t0 = time.perf_counter()
+    full = reason_levels(yBelief, matFeature, pLoc, pAbs, None, pModList, None)
+    t1 = time.perf_counter()
+    compact = reason_levels(yBelief, matCompact, pLoc, pAbs, None, pModList, None)
+    t2 = time.perf_counter()
+    distFull = get_cosineMatrix(matFeature)
+    distCompact = get_cosineMatrix(matCompact)
+    iu = np.triu_indices(len(distFull), 1)
+    distErr = np.nanmax(np.abs(distFull[iu] - distCompact[iu]))
+    ans = []
+    for k in range(len(pModList)):
+        pMod = pModList[k]
+        mFull = get_locationMatrix(full[k], pLoc) > 0
+        mCompact = get_locationMatrix(compact[k], pLoc) > 0
+        nHit = np.sum(mFull & mCompact)
+        recall = nHit / max(np.sum(mFull), 1)
+        precision = nHit / max(np.sum(mCompact), 1)
+        accuracy = np.mean(np.all(mFull == mCompact, axis = 1))     #items with identical location sets
+        pairAgree = np.mean((distFull[iu] <= pMod) == (distCompact[iu] <= pMod))
+        ans.append([pAbs, pMod, str(np.asarray(matCompact).dtype), np.asarray(matCompact).shape[1], pairAgree, recall, precision, accuracy, distErr, t1-t0, t2-t1, np.asarray(matFeature).nbytes, np.asarray(matCompact).nbytes])
+    ans = pd.DataFrame(ans, columns = ['abstraction type', 'level', 'dtype', 'nDim', 'pair agreement', 'recall', 'precision', 'accuracy', 'max dist error', 'float64 time (s)', 'compact time (s)', 'float64 bytes', 'compact bytes'])
+    return ans
+
+#subfunction of review (return canonical signature per plan, i.e. its sorted (location, item) pairs to visit as bytes)
+def get_planSignature(pX, pLoc):
+    ix = np.flatnonzero(pX['loc'] < len(pLoc)-1)       #'self' entries are not run, so plans differing only there are the same
+    order = ix[np.lexsort((pX['item'][ix], pX['loc'][ix], pX['plan'][ix]))]
+    pair = (pX['loc'][order].astype(np.int64) << 32) | pX['item'][order]
+    bound = np.searchsorted(pX['plan'][order], np.arange(pX['nPlan'] + 1))
+    ans = [pair[bound[i]:bound[i+1]].tobytes() for i in range(pX['nPlan'])]
+    return ans
 
 #function (return unique plans, sorted by scores)
 def review(yTemp, yPlan, pLoc, pInc, pTop = None):
-    if len(yTemp.columns)>0:
-        ix = yTemp.index.values.tolist()
-        ix = pd.Series(ix)
-        if yPlan is None: 
-            yPlan = yTemp.copy(deep=True)
-            planP = list(yPlan.T.values)
-            planP = [list(x) for x in planP]
-                
-        else:
-            nLoc = len(pLoc)
-            yPlan = yPlan.T.reset_index(drop=True).T
-            yTemp = yTemp.T.reset_index(drop=True).T
-            
-            planP = list(yPlan.T.values)
-            planP = [list(x) for x in planP]
-            planNP = [x[0:nLoc] for x in planP]
-            
-            for i in range(len(yTemp.columns)):
-                tempP = list(yTemp[i])
-                tempNP = tempP[0:nLoc]
-                if tempNP not in planNP: planP.append(tempP)
-        planP.sort(key=lambda x: x[-1], reverse = True)
-        high_score = planP[0][-1]
-        ix_high = [i for i in range(0,len(planP)) if planP[i][-1]==high_score]
-        ix_high = max(ix_high) + 1
-        planP_low = planP[ix_high:]
-        planP_high = planP[:ix_high]
+    if yTemp['nPlan']>0:
+        
+        #keep plans not seen before (including plans cut by an earlier pTop)
+        seen = set() if yPlan is None else set(yPlan['seen'])
+        ix = []
+        for i, sig in enumerate(get_planSignature(yTemp, pLoc)):
+            if sig not in seen: 
+                seen.add(sig)
+                ix.append(i)
+        planP = select_plans(yTemp, ix)
+        if yPlan is not None: planP = join_plans([yPlan, planP])
+        if planP['nPlan'] == 0: return yPlan
+        
+        #shuffle plans tied at the high score (or value, if estimated), then take the rest in that order
+        temp = planP['value'] if 'value' in planP else planP['score']
+        planP_high = list(np.flatnonzero(temp == temp.max()))
         random.seed(pInc)
         random.shuffle(planP_high)
-        planP = planP_high + planP_low
-        if pTop is not None: planP = planP[0:pTop]
-        ans = pd.DataFrame(planP)   
-        ans = ans.T
-        ans = ans.set_index(ix)
-        ans = ans.rename(columns=lambda x: 'P'+ str(x))
+        if pTop is None: 
+            planP_low = list(np.argsort(-temp, kind = 'stable')[len(planP_high):])
+        elif len(planP_high) >= pTop: 
+            planP_low = []
+        else:
+            ix_low = np.flatnonzero(temp < temp.max())
+            planP_low = heapq.nlargest(pTop - len(planP_high), ix_low, key = lambda i: (temp[i], -i))
+        order = planP_high + planP_low
+        if pTop is not None: order = order[0:pTop]
+        ans = select_plans(planP, order)
+        ans['seen'] = seen
     elif yPlan is not None: 
         ans = yPlan
     else:  
@@ -522,6 +1159,9 @@ def review(yTemp, yPlan, pLoc, pInc, pTop = None):
 
 #function (return item predictions, minus observations)
 def recall(yReason, xNoFind):
+    if isinstance(yReason, np.ndarray): 
+        ans = yReason & ~xNoFind            #xNoFind as items x locations
+        return ans
     ans = [x[:] for x in yReason]
     for i in range(len(xNoFind)):
         for j in range(len(xNoFind[i])):
@@ -532,6 +1172,11 @@ def recall(yReason, xNoFind):
 #function (return item belief, updated with observations)
 def revise(yBelief, xObserve, xNoFind, pLoc):
     
+    #add observations, remove noFind (observations at unknown locations have no column)
+    if isinstance(yBelief, np.ndarray):
+        ans = (yBelief | get_locationMatrix(xObserve, pLoc)) & ~get_locationMatrix(xNoFind, pLoc)
+        return ans
+    
     #add observations
     ans = [x[:] for x in yBelief]
     for i in range(len(ans)): ans[i].extend(xObserve[i])
@@ -549,5 +1194,25 @@ def revise(yBelief, xObserve, xNoFind, pLoc):
         ans[i] = tempFilt  
     return ans
 
+#function (return item belief, updated with observations of earlier trials from the prior store, pPrior = {'share', 'min'})
+def revise_prior(yBelief, mPrior, id_item, pLoc, pPrior):
+    ans = get_locationMatrix(yBelief, pLoc).copy()
+    if mPrior is None: return ans
+    
+    #counts aligned to items x locations of this trial (names not stored count zero)
+    ixItem = [mPrior['item'].index(x) if x in mPrior['item'] else -1 for x in id_item]
+    ixLoc = [mPrior['loc'].index(x) if x in mPrior['loc'] else -1 for x in pLoc]
+    count = {}
+    for key in ['observe', 'nofind']:
+        temp = np.pad(mPrior[key], ((0,1),(0,1)))                  #last row and column are zero, for unknown names
+        count[key] = temp[np.ix_(ixItem, ixLoc)]
+    
+    #add locations where items were mostly found, remove those where they were mostly missing
+    total = count['observe'] + count['nofind']
+    share = np.divide(count['observe'], total, out = np.zeros(total.shape), where = total > 0)
+    known = total >= pPrior.get('min', 1)
+    ans = (ans | (known & (share >= pPrior.get('share', 0.5)))) & ~(known & (share < pPrior.get('share', 0.5)))
+    return ans
+
 # =============================================================================
 
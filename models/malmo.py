@@ -768,8 +768,96 @@ def makePath(x0, z0, xF, zF, allow_diagonal_movement = False):
     warn("Couldn't get a path to destination")
     return [],[end]
     
+#locations in the order run visits them (CW around the map), started at the closest one
+pRoute = ['church', 'restaurant', 'store', 'hospital', 'library', 'museum',
+          'farm', 'landfill', 'lake', 'bedroom', 'kitchen', 'gas station', 
+          'house', 'school', 'post office', 'office',  'garden', 'brewery']
+
+#subfunction of get_travelTable (return maze and its discretization, as used by makePath)
+def get_mazeInfo():
+    mapLim = pd.read_excel('utils/map.xlsx')
+    mapLim = mapLim.drop(columns = ['set'])
+    mapLim = mapLim.set_index('loc')
+    xMin = mapLim.iloc[-1, 0]
+    xMax = mapLim.iloc[-1, 1]
+    zMin = mapLim.iloc[-1, 2]
+    zMax = mapLim.iloc[-1, 3]
+    maze = pd.read_excel('utils/maze.xlsx')
+    maze = maze.values
+    dx_maze = round((xMax -xMin) / len(maze[0]), 2)
+    dz_maze = round((zMax -zMin) / len(maze), 2)
+    ans = {'maze': maze, 'xMin': xMin, 'zMin': zMin, 'dx': dx_maze, 'dz': dz_maze, 'mapLim': mapLim[:-1]}
+    return ans
+
+#subfunction of get_travelTable (return maze node of coordinates, moved off walls as makePath moves its end)
+def get_mazeNode(x, z, mazeInfo):
+    maze = mazeInfo['maze']
+    nx = int(round((x - mazeInfo['xMin'])/mazeInfo['dx'] -0.5,0))
+    nz = int(round((z - mazeInfo['zMin'])/mazeInfo['dz'] -0.5,0))
+    nx = min(max(nx, 0), len(maze[0])-1)
+    nz = min(max(nz, 0), len(maze)-1)
+    ans = (nz, nx)
+    if maze[ans] == 1:
+        for i in range(5):
+            if nx+i < len(maze[0]) and maze[(nz, nx+i)] == 0: 
+                ans = (nz, nx+i)
+                break
+            if nz+i < len(maze) and maze[(nz+i, nx)] == 0: 
+                ans = (nz+i, nx)
+                break
+    return ans
+
+#subfunction of get_travelTable (return steps from start to every maze node, breadth first over walkable nodes)
+def get_mazeSteps(start, mazeInfo):
+    maze = mazeInfo['maze']
+    ans = np.full(maze.shape, np.inf)
+    ans[start] = 0
+    queue = [start]
+    for node in queue:
+        for d in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            temp = (node[0] + d[0], node[1] + d[1])
+            if temp[0] < 0 or temp[1] < 0 or temp[0] >= maze.shape[0] or temp[1] >= maze.shape[1]: continue
+            if maze[temp] != 0 or ans[temp] < np.inf: continue
+            ans[temp] = ans[node] + 1
+            queue.append(temp)
+    return ans
+
+#function (return walking distance between location entrances, map units, computed once from the maze)
+def get_travelTable():
+    mazeInfo = get_mazeInfo()
+    mapLim = mazeInfo['mapLim']
+    step = (mazeInfo['dx'] + mazeInfo['dz']) / 2
+    node = [get_mazeNode(mapLim.loc[x,'xent'], mapLim.loc[x,'zent'], mazeInfo) for x in mapLim.index]
+    ans = np.zeros((len(node), len(node)))
+    for i in range(len(node)):
+        steps = get_mazeSteps(node[i], mazeInfo)
+        ans[i] = [steps[x] * step for x in node]
+    ans = pd.DataFrame(ans, index = mapLim.index, columns = mapLim.index)
+    ans = {'dist': ans, 'mazeInfo': mazeInfo}
+    return ans
+
+#function (return travel inputs for plan scoring from the current position, arrays aligned to pLoc)
+def get_travel(iPos, pLoc, mTravel):
+    mazeInfo = mTravel['mazeInfo']
+    mapLim = mazeInfo['mapLim']
+    step = (mazeInfo['dx'] + mazeInfo['dz']) / 2
+    steps = get_mazeSteps(get_mazeNode(iPos[0], iPos[1], mazeInfo), mazeInfo)
+    loc = [x for x in pLoc if x in mapLim.index]
+    ix = [pLoc.index(x) for x in loc]
+    nLoc = len(pLoc)
+    ans = {}
+    ans['order'] = np.full(nLoc, -1)                       #rank in route, -1 if not visited (e.g. self)
+    ans['order'][ix] = [pRoute.index(x) for x in loc]
+    ans['pos'] = np.zeros(nLoc)                            #walking distance from position
+    ans['pos'][ix] = [steps[get_mazeNode(mapLim.loc[x,'xent'], mapLim.loc[x,'zent'], mazeInfo)] * step for x in loc]
+    ans['near'] = np.full(nLoc, np.inf)                    #straight distance from position (run starts at the smallest)
+    ans['near'][ix] = [np.sqrt((mapLim.loc[x,'xent'] - iPos[0])**2 + (mapLim.loc[x,'zent'] - iPos[1])**2) for x in loc]
+    ans['loc'] = np.zeros((nLoc, nLoc))                    #walking distance between locations
+    ans['loc'][np.ix_(ix, ix)] = mTravel['dist'].loc[loc, loc].values
+    return ans
+
 #function (run plan per trial conditions)    
-def run(iEnv, iPlan):
+def run(iEnv, iPlan, pAll = False):
         
     #READ PACK
     xObserve    = iEnv[0]      #observations within any given location
@@ -1022,9 +1110,7 @@ def run(iEnv, iPlan):
         else:
                    
             #filter locations by set
-            route = ['church', 'restaurant', 'store', 'hospital', 'library', 'museum',
-                         'farm', 'landfill', 'lake', 'bedroom', 'kitchen', 'gas station', 
-                         'house', 'school', 'post office', 'office',  'garden', 'brewery']
+            route = pRoute
             possLoc =  list(iPlan.index.values)
             route = [x for x in route if x in possLoc]
             
@@ -1183,7 +1269,9 @@ def run(iEnv, iPlan):
         print('locations:', sLocList)
         print('items:', sItemList)
         
+        fFail = False
         for i in range(len(sLocList)):  
+            if i > 0 and fSearch: fFail = True      #last location ended with items missing (only with pAll)
             sLoc    = sLocList[i]
             sItem   = sItemList[i]       
             fSearch = True
@@ -1224,7 +1312,9 @@ def run(iEnv, iPlan):
             #check timer
             search_t1 = np.round(time.time(), 2)
             searchTime = np.round((search_t1 - search_t0),2)
-            if searchTime > max_search_time: break           #end plan (fail)
+            if searchTime > max_search_time:
+                if pAll: continue                               #go on to next location (items of other tasks)
+                break                                           #end plan (fail)
 
             #location N
             fSearch, iPos, iStats, xObserve, xNoFind, state = observe(fSearch, iPos, iStats, xObserve, xNoFind, mapLim, sItem, sLoc, state) #location entrance
@@ -1243,7 +1333,9 @@ def run(iEnv, iPlan):
             #check timer
             search_t1 = np.round(time.time(), 2)
             searchTime = np.round((search_t1 - search_t0),2)
-            if searchTime > max_search_time: break           #end plan (fail)
+            if searchTime > max_search_time:
+                if pAll: continue                               #go on to next location (items of other tasks)
+                break                                           #end plan (fail)
 
             #location E
             fSearch, iPos, iStats, xObserve, xNoFind, state = observe(fSearch, iPos, iStats, xObserve, xNoFind, mapLim, sItem, sLoc, state) #location entrance
@@ -1262,7 +1354,9 @@ def run(iEnv, iPlan):
             #check timer
             search_t1 = np.round(time.time(), 2)
             searchTime = np.round((search_t1 - search_t0),2)
-            if searchTime > max_search_time: break           #end plan (fail)
+            if searchTime > max_search_time:
+                if pAll: continue                               #go on to next location (items of other tasks)
+                break                                           #end plan (fail)
 
             #location S
             fSearch, iPos, iStats, xObserve, xNoFind, state = observe(fSearch, iPos, iStats, xObserve, xNoFind, mapLim, sItem, sLoc, state) #location entrance
@@ -1281,7 +1375,9 @@ def run(iEnv, iPlan):
             #check timer
             search_t1 = np.round(time.time(), 2)
             searchTime = np.round((search_t1 - search_t0),2)
-            if searchTime > max_search_time: break           #end plan (fail)
+            if searchTime > max_search_time:
+                if pAll: continue                               #go on to next location (items of other tasks)
+                break                                           #end plan (fail)
 
             #location W
             fSearch, iPos, iStats, xObserve, xNoFind, state = observe(fSearch, iPos, iStats, xObserve, xNoFind, mapLim, sItem, sLoc, state) #location entrance
@@ -1296,15 +1392,18 @@ def run(iEnv, iPlan):
             if not state.is_mission_running: break
             
             if not fSearch: continue    #end search for current item   
-            if fSearch: break           #end plan 
+            if fSearch and not pAll: break           #end plan 
             
             #check timer
             search_t1 = np.round(time.time(), 2)
             searchTime = np.round((search_t1 - search_t0),2)
-            if searchTime > max_search_time: break           #end plan (fail)
+            if searchTime > max_search_time:
+                if pAll: continue                               #go on to next location (items of other tasks)
+                break                                           #end plan (fail)
             print(search_t0, search_t1, searchTime)
 
         #update result
+        fSearch = fSearch or fFail      #with pAll, any location with items missing fails the plan
         if fSearch:                     #fail (still searching for item)
             iResult = -1
             print('PLAN FAIL!')
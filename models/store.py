@@ -0,0 +1,235 @@
+# =============================================================================
+# Construal Level Theory for Agent-based Planning
+#
+# C McClurg, AR Wagner, S Rajtmajer
+# =============================================================================
+# STORE-SPECIFIC FILE
+# Purpose: collection of functions to keep and reuse results of the construal process
+# =============================================================================
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+#function (return empty memo, i.e. LRU map bounded by entry count and optionally by array bytes, with hit/miss counters)
+def get_memo(size, maxByte = None):
+    ans = {'data': collections.OrderedDict(), 'size': size, 'maxByte': maxByte, 'byte': {}, 'hit': 0, 'miss': 0, 'lock': threading.Lock()}
+    return ans
+
+#subfunction of memo_put (return bytes held by arrays in a value, e.g. a plan container)
+def get_memoBytes(value):
+    if isinstance(value, np.ndarray): return value.nbytes
+    if isinstance(value, dict): return sum(get_memoBytes(x) for x in value.values())
+    if isinstance(value, (list, tuple)): return sum(get_memoBytes(x) for x in value)
+    return 0
+
+#function (return memoized value for key, or None on a miss)
+def memo_get(memo, key):
+    with memo['lock']:
+        if key in memo['data']:
+            memo['hit'] += 1
+            memo['data'].move_to_end(key)           #most recently used is last
+            return memo['data'][key]
+        memo['miss'] += 1
+    return None
+
+#function (return value after storing it under key, evicting the least recently used; values over maxByte alone are not stored)
+def memo_put(memo, key, value):
+    with memo['lock']:
+        if memo['maxByte'] is not None:
+            nByte = get_memoBytes(value)
+            if nByte > memo['maxByte']: return value
+            memo['byte'][key] = nByte
+        memo['data'][key] = value
+        memo['data'].move_to_end(key)
+        while len(memo['data']) > memo['size'] or (memo['maxByte'] is not None and sum(memo['byte'].values()) > memo['maxByte']): 
+            old = memo['data'].popitem(last = False)[0]
+            memo['byte'].pop(old, None)
+    return value
+
+#function (return memo emptied, counters kept)
+def memo_clear(memo):
+    with memo['lock']: 
+        memo['data'].clear()
+        memo['byte'].clear()
+    return memo
+
+#function (return memo counters, one row per memo)
+def get_memoReport(memoDict):
+    cols = ['memo', 'size', 'count', 'MB', 'hit', 'miss', 'hit rate']
+    rows = []
+    for name, memo in memoDict.items():
+        total = memo['hit'] + memo['miss']
+        rate = memo['hit'] / total if total > 0 else np.nan
+        mb = sum(memo['byte'].values()) / 1e6 if memo['maxByte'] is not None else np.nan
+        rows.append([name, memo['size'], len(memo['data']), np.round(mb, 1), memo['hit'], memo['miss'], np.round(rate, 3)])
+    ans = pd.DataFrame(rows, columns = cols)
+    return ans
+
+#subfunction of many functions (return fingerprint of any key part, arrays by content)
+def get_keyPart(a):
+    if isinstance(a, np.ndarray) or isinstance(a, np.matrix):
+        a = np.ascontiguousarray(a)
+        ans = hashlib.sha1(str((a.shape, a.dtype.str)).encode())
+        ans.update(a.data)
+        ans = ans.hexdigest()
+    elif hasattr(a, 'tocsr'):                   #sparse matrix
+        a = a.tocsr()
+        ans = hashlib.sha1(str((a.shape, a.dtype.str)).encode())
+        for x in [a.indptr, a.indices, a.data]: ans.update(np.ascontiguousarray(x).data)
+        ans = ans.hexdigest()
+    elif isinstance(a, (list, tuple)) and all(isinstance(x, (int, float, str, bool, type(None))) for x in a):
+        ans = tuple(a)
+    elif isinstance(a, (int, float, str, bool, type(None))):
+        ans = a
+    else:
+        ans = hashlib.sha1(repr(a).encode()).hexdigest()     #nested lists, dicts (e.g. belief lists, options)
+    return ans
+
+#function (return memo key from parts)
+def get_key(*parts):
+    ans = tuple(get_keyPart(x) for x in parts)
+    return ans
+
+#function (return content hash of an input file)
+def get_fileHash(path):
+    ans = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): ans.update(chunk)
+    ans = ans.hexdigest()
+    return ans
+
+#subfunction of disk_call (return stored value at path, or None if missing or unreadable)
+def disk_get(path):
+    try:
+        with open(path, 'rb') as f: ans = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        ans = None
+    return ans
+
+#subfunction of disk_call (return path after writing value atomically, so concurrent workers never read a partial file)
+def disk_put(path, value):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok = True)
+    fd, temp = tempfile.mkstemp(dir = folder, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f: pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)                  #last writer wins, both wrote the same content
+    except BaseException:
+        if os.path.exists(temp): os.remove(temp)
+        raise
+    return path
+
+#function (return func(*args), read from the disk cache if stored under the same inputs, else computed and stored)
+def disk_call(pCache, name, parts, func, *args):
+    if pCache is None: return func(*args)
+    key = get_key(name, pCache.get('src'), *parts)
+    key = hashlib.sha1(repr(key).encode()).hexdigest()
+    path = os.path.join(pCache['dir'], name, key[:2], key + '.pkl')
+    ans = disk_get(path)
+    if ans is None:
+        ans = func(*args)
+        disk_put(path, ans)
+    return ans
+
+#function (return handle to read-only arrays written once to pDir, attached by workers with attach_arrays)
+def share_arrays(pDir, pArrays):
+    os.makedirs(pDir, exist_ok = True)
+    kind = {}
+    for name, a in pArrays.items():
+        if hasattr(a, 'tocsr'):                     #sparse matrix, as its three csr arrays
+            a = a.tocsr()
+            for part in ['data', 'indices', 'indptr']: 
+                np.save(os.path.join(pDir, name + '.' + part + '.npy'), getattr(a, part))
+            kind[name] = ('csr', a.shape)
+        elif isinstance(a, np.ndarray):
+            np.save(os.path.join(pDir, name + '.npy'), np.asarray(a))
+            kind[name] = ('array', None)
+        else:                                       #small python objects (e.g. item names)
+            disk_put(os.path.join(pDir, name + '.pkl'), a)
+            kind[name] = ('object', None)
+    ans = {'dir': pDir, 'kind': kind}
+    return ans
+
+#function (return arrays from a share_arrays handle, memory-mapped read-only so workers share one copy)
+def attach_arrays(pShare):
+    ans = {}
+    for name, (kind, shape) in pShare['kind'].items():
+        path = os.path.join(pShare['dir'], name)
+        if kind == 'csr': 
+            part = [np.load(path + '.' + x + '.npy', mmap_mode = 'r') for x in ['data', 'indices', 'indptr']]
+            ans[name] = sparse.csr_matrix(tuple(part), shape = shape, copy = False)
+        elif kind == 'array': 
+            ans[name] = np.load(path + '.npy', mmap_mode = 'r')
+        else: 
+            ans[name] = disk_get(path + '.pkl')
+    return ans
+
+#subfunction of prior_put (return lock file descriptor once created exclusively, taking over a lock older than pStale seconds)
+def get_lock(path, pStale = 60):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    while True:
+        try: 
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > pStale: os.remove(path)      #writer died holding the lock
+            except OSError:
+                pass
+            time.sleep(0.05)
+
+#subfunction of prior_put (return nothing after releasing a lock from get_lock)
+def free_lock(path, fd):
+    os.close(fd)
+    os.remove(path)
+
+#subfunction of many functions (return path of the prior store of a location set)
+def get_priorPath(pPrior, iSet):
+    ans = os.path.join(pPrior['dir'], 'prior_set' + str(iSet) + '.pkl')
+    return ans
+
+#function (return prior store of a location set, i.e. trial count and observed / failed search counts as items x locations, or None if empty)
+def prior_get(pPrior, iSet):
+    ans = disk_get(get_priorPath(pPrior, iSet))
+    return ans
+
+#function (return prior store after adding one finished trial's observations and failed searches, under a lock so trials never lose counts)
+def prior_put(pPrior, iSet, id_item, xObserve, xNoFind):
+    path = get_priorPath(pPrior, iSet)
+    fd = get_lock(path + '.lock')
+    try:
+        ans = disk_get(path)
+        if ans is None: ans = {'trial': 0, 'item': [], 'loc': [], 'observe': np.zeros((0,0), dtype = int), 'nofind': np.zeros((0,0), dtype = int)}
+        
+        #extend items and locations by names not stored yet
+        item, loc = list(ans['item']), list(ans['loc'])
+        seenItem, seenLoc = set(item), set(loc)
+        for x in id_item:
+            if x not in seenItem: item.append(x); seenItem.add(x)
+        for x in xObserve + xNoFind:
+            for y in x:
+                if y not in seenLoc: loc.append(y); seenLoc.add(y)
+        for key in ['observe', 'nofind']:
+            temp = np.zeros((len(item), len(loc)), dtype = int)
+            temp[:ans[key].shape[0], :ans[key].shape[1]] = ans[key]
+            ans[key] = temp
+        ans['item'], ans['loc'] = item, loc
+        
+        #count each (item, location) once per trial
+        ixItem = {x: i for i, x in enumerate(item)}
+        ixLoc = {x: i for i, x in enumerate(loc)}
+        for key, xTemp in [('observe', xObserve), ('nofind', xNoFind)]:
+            for i in range(len(id_item)):
+                for x in set(xTemp[i]): ans[key][ixItem[id_item[i]], ixLoc[x]] += 1
+        ans['trial'] += 1
+        disk_put(path, ans)
+    finally:
+        free_lock(path + '.lock', fd)
+    return ans
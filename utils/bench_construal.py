@@ -0,0 +1,122 @@
+# =============================================================================
+# Construal Level Theory for Agent-based Planning
+#
+# C McClurg, AR Wagner, S Rajtmajer
+# =============================================================================
+
+import os
+import sys
+import inspect
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir) 
+
+from models.construal import get_recipeMatrix, get_cosineMatrix, get_centroids, get_locationMatrix
+from models.construal import abstract_similar, abstract_cluster, L, R, plan, review, clear_memos
+import io
+import time
+import datetime
+import contextlib
+import numpy as np
+import pandas as pd
+
+#inputs
+pItem    = [100, 300, 1000, 3000]   #catalog sizes
+pLoc     = 20                       #locations (plus 'self')
+pDim     = 300                      #feature dimensions
+pDensity = 0.05                     #share of locations believed per item
+pDepth   = 3                        #recipe depth (layers below the task)
+pFanIn   = 2                        #ingredients per recipe
+pMod     = 0.8                      #abstraction level for similar / cluster
+pRep     = 5                        #repeats per timing (best and median kept)
+pSeed    = 0
+pBase    = None                     #earlier baseline csv to compare against (None = no comparison, e.g. ../output/bench_construal_baseline.csv)
+
+#function (return synthetic item names and recipe table, layered so recipes have fixed depth and fan-in)
+def get_catalog(nItem, nDepth, nFanIn, rng):
+    id_item = ['item' + str(i) for i in range(nItem)]
+    layer = np.minimum(np.arange(nItem) * (nDepth + 1) // nItem, nDepth)
+    df = pd.DataFrame(index = id_item)
+    for k in range(5):
+        df['c' + str(k)] = ''
+        df['n' + str(k)] = 0
+    for i in range(nItem):
+        below = np.flatnonzero(layer == layer[i] + 1)
+        if len(below) == 0: continue                        #raw item
+        for k, j in enumerate(rng.choice(below, min(nFanIn, len(below), 5), replace = False)):
+            df.iloc[i, 2*k] = id_item[j]
+            df.iloc[i, 2*k+1] = int(rng.integers(1, 5))
+    return id_item, df
+
+#function (return synthetic features, clustered so neighbors exist at usual thresholds)
+def get_features(nItem, nDim, rng):
+    center = rng.standard_normal((max(nItem // 10, 1), nDim))
+    ans = center[rng.integers(0, len(center), nItem)] + 0.5 * rng.standard_normal((nItem, nDim))
+    return ans
+
+#function (return synthetic belief lists with given density, every item at one location or more)
+def get_belief(nItem, locs, density, rng):
+    mat = rng.random((nItem, len(locs))) < density
+    mat[np.arange(nItem), rng.integers(0, len(locs), nItem)] = True
+    ans = [[locs[j] for j in np.flatnonzero(x)] for x in mat]
+    return ans
+
+#function (return best and median seconds of func(*args), caches cleared before each repeat)
+def get_timing(func, *args):
+    ans = []
+    for i in range(pRep):
+        clear_memos()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            func(*args)
+            ans.append(time.perf_counter() - t0)
+    return np.min(ans), np.median(ans)
+
+#run benchmark
+rng = np.random.default_rng(pSeed)
+locs = ['loc' + str(j) for j in range(pLoc)] + ['self']
+rows = []
+for nItem in pItem:
+    id_item, df_recipe = get_catalog(nItem, pDepth, pFanIn, rng)
+    mFeature = get_features(nItem, pDim, rng)
+    yBelief = get_belief(nItem, locs[:-1], pDensity, rng)
+    mRecipe = get_recipeMatrix(id_item, df_recipe)
+    mLocation = get_locationMatrix(yBelief, locs)
+    xPossess = np.zeros(nItem)
+    pTask = id_item[0]                                      #top layer, needs every depth
+    xTest = np.zeros(nItem)
+    xTest[0] = 1
+    xLevel = R(mRecipe.transpose().tocsr(), xTest)
+    with contextlib.redirect_stdout(io.StringIO()):
+        yTemp = plan(yBelief, xPossess, mRecipe, id_item, locs, pTask, 0)
+    
+    case = {}
+    case['get_recipeMatrix'] = (get_recipeMatrix, id_item, df_recipe)
+    case['get_cosineMatrix'] = (get_cosineMatrix, mFeature)
+    case['get_centroids']    = (get_centroids, mLocation, mFeature, pMod, locs)
+    case['abstract_similar'] = (abstract_similar, yBelief, mFeature, pMod)
+    case['abstract_cluster'] = (abstract_cluster, yBelief, mFeature, pMod, locs)
+    case['L']                = (L, mLocation.transpose(), xLevel)
+    case['R']                = (R, mRecipe.transpose().tocsr(), xTest)
+    case['plan']             = (plan, yBelief, xPossess, mRecipe, id_item, locs, pTask, 0)
+    case['review']           = (review, yTemp, None, locs, 0)
+    for name, (func, *args) in case.items():
+        best, median = get_timing(func, *args)
+        rows.append([name, nItem, pLoc, pDim, pDensity, pDepth, pFanIn, yTemp['nPlan'], pRep, best, median])
+        print('{:<18} {:>6} items  best {:.5f} s  median {:.5f} s'.format(name, nItem, best, median))
+
+#save baseline (machine readable)
+cols = ['function', 'nItem', 'nLoc', 'nDim', 'density', 'depth', 'fanIn', 'nPlan', 'repeats', 'best (s)', 'median (s)']
+ans = pd.DataFrame(rows, columns = cols)
+d = datetime.datetime.now().strftime('%Y-%m%d-%H%M')
+filename = os.path.join(parentdir, 'output', 'bench_construal_{}.csv'.format(d))
+ans.to_csv(filename, index = False)
+print('saved', filename)
+
+#compare with earlier baseline (speedup > 1 is faster than baseline)
+if pBase is not None:
+    base = pd.read_csv(pBase)
+    temp = ans.merge(base, on = cols[:7], suffixes = ('', ' base'))
+    temp['speedup'] = temp['best (s) base'] / temp['best (s)']
+    print(temp[['function', 'nItem', 'best (s) base', 'best (s)', 'speedup']].to_string(index = False))
@@ -0,0 +1,44 @@
+# =============================================================================
+# Construal Level Theory for Agent-based Planning
+#
+# C McClurg, AR Wagner, S Rajtmajer
+# =============================================================================
+
+import os
+import glob
+import inspect
+import pandas as pd
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+
+#inputs
+pFile = None                        #sweep output (None = newest in ../output)
+pGroup = 'abstraction type'         #column to split the summary by
+pQuant = [0.50, 0.95, 0.99]
+
+#read sweep output
+if pFile is None: 
+    temp = glob.glob(os.path.join(parentdir, 'output', 'clt-planning_*.xlsx'))
+    temp = [x for x in temp if not x.endswith('_timing.xlsx')]      #summaries written by this script
+    pFile = sorted(temp, key = os.path.getmtime)[-1]
+df = pd.read_excel(pFile, index_col = 0)
+df[pGroup] = [str(int(x)) if isinstance(x, float) and x.is_integer() else str(x) for x in df[pGroup].fillna('None')]
+
+#stage columns (timings per stage and level, then sizes)
+cols = [x for x in df.columns if x.endswith('(s)') or x.startswith(('plans L', 'product L', 'review input L'))]
+cols = ['plan time (min)'] + cols
+    
+#percentiles per stage and group
+ans = []
+for col in cols:
+    for group, temp in df.groupby(pGroup):
+        val = temp[col].astype(float).quantile(pQuant).values
+        ans.append([col, group, len(temp)] + list(val))
+ans = pd.DataFrame(ans, columns = ['stage', pGroup, 'trials'] + ['p' + str(int(x*100)) for x in pQuant])
+
+pd.set_option('display.width', 200)
+pd.set_option('display.max_rows', 500)
+print(pFile)
+print(ans.to_string(index = False))
+ans.to_excel(pFile.replace('.xlsx', '_timing.xlsx'), index = False)